@@ -55,6 +55,13 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Транзакции сразу берут блокировку записи и ждут её до timeout
+        # секунд, а не падают с "database is locked" при одновременных
+        # изменениях (например, добавлении в корзину из нескольких воркеров).
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+        # Тестовая база в файле: общая in-memory база SQLite не допускает
+        # одновременной записи из нескольких потоков в тестах конкурентности.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -94,6 +101,54 @@ REST_FRAMEWORK = {
     ],
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ordering-service",
+        "OPTIONS": {
+            "MAX_ENTRIES": 5000,
+            "CULL_FREQUENCY": 4,
+        },
+    },
+    # Гостевые корзины: файловый кэш общий для всех воркеров на хосте, в
+    # отличие от locmem. Для нескольких хостов — Redis или Memcached.
+    "carts": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "var" / "guest_carts",
+        "TIMEOUT": 60 * 60 * 24 * 7,
+        "OPTIONS": {
+            "MAX_ENTRIES": 50000,
+            "CULL_FREQUENCY": 4,
+        },
+    },
+}
+
+# Списки API строятся из .values() без создания экземпляров моделей.
+API_VALUES_FAST_PATH = True
+
+CATALOG_CACHE_TIMEOUT = 600
+CATALOG_CACHE_LOCK_TIMEOUT = 5
+
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 500
+CATALOG_FACET_LIMIT = 50
+CATALOG_BULK_MAX_ITEMS = 500
+CART_BATCH_MAX_OPERATIONS = 100
+GUEST_CART_CACHE_ALIAS = "carts"
+# Срок жизни гостевой корзины с последнего изменения, секунды.
+GUEST_CART_TTL = 60 * 60 * 24 * 7
+GUEST_CART_MAX_ITEMS = 100
+CATALOG_EXPORT_CHUNK_SIZE = 2000
+# Файл снимка каталога для чтения товаров, категорий и поставщиков без
+# запросов к базе (python manage.py build_catalog_snapshot). None — не
+# использовать; load_data и sync_stock пересобирают снимок после загрузки.
+CATALOG_SNAPSHOT_PATH = None
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 1.0
+CATALOG_SEARCH_RANK_WINDOW = 2000
+CATALOG_AUTOCOMPLETE_REFRESH_INTERVAL = 1.0
+CATALOG_AUTOCOMPLETE_LIMIT = 10
+CATALOG_AUTOCOMPLETE_MAX_LIMIT = 50
+
 APPEND_SLASH = True
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
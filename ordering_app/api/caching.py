@@ -0,0 +1,187 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from ordering_app.catalog import catalog_version_token, get_catalog_state
+from ordering_app.snapshot import get_catalog_snapshot
+
+LOCK_STRIPES = [threading.Lock() for _ in range(64)]
+
+
+class CatalogCacheMixin:
+    # Кэширует данные ответов каталога под ключом текущей версии каталога:
+    # любое изменение товаров, категорий или поставщиков меняет версию,
+    # и старые записи просто перестают запрашиваться и вытесняются по LRU.
+    # Та же версия служит ETag, поэтому повторный запрос клиента с
+    # If-None-Match получает 304 без сериализации.
+    cache_alias = "default"
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(request, super().retrieve, *args, **kwargs)
+
+    def catalog_response(self, request, view, *args, **kwargs):
+        version, catalog_updated_at = get_catalog_state()
+        token = catalog_version_token(version, catalog_updated_at)
+        self.catalog_token = token
+        etag = self.get_etag(request, token)
+        last_modified = self.get_last_modified(request, catalog_updated_at, **kwargs)
+
+        not_modified = get_conditional_response(
+            request._request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if not_modified is not None:
+            response = not_modified
+        else:
+            response = self.cached_response(request, token, view, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+        return response
+
+    def cached_response(self, request, token, view, *args, **kwargs):
+        cache = caches[self.cache_alias]
+        key = self.get_cache_key(request, token)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        # Защита от «эффекта толпы»: при промахе ответ строит один поток
+        # процесса (блокировка по полосе ключа) и, через cache.add, один
+        # процесс среди всех воркеров; остальные ждут готовый результат.
+        with LOCK_STRIPES[hash(key) % len(LOCK_STRIPES)]:
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            lock_key = f"{key}:lock"
+            lock_timeout = settings.CATALOG_CACHE_LOCK_TIMEOUT
+            acquired = cache.add(lock_key, 1, lock_timeout)
+            if not acquired:
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    data = cache.get(key)
+                    if data is not None:
+                        return Response(data)
+
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+                return response
+            finally:
+                if acquired:
+                    cache.delete(lock_key)
+
+    def get_cache_key(self, request, token):
+        url = hashlib.md5(request.build_absolute_uri().encode("utf-8")).hexdigest()
+        return f"catalog:{token}:{self.basename}:{url}"
+
+    def get_etag(self, request, token):
+        # Представление зависит и от Accept (JSON или browsable API).
+        source = "\n".join(
+            [token, request.build_absolute_uri(), request.META.get("HTTP_ACCEPT", "")]
+        )
+        return f'"{hashlib.md5(source.encode("utf-8")).hexdigest()}"'
+
+    def get_last_modified(self, request, catalog_updated_at, **kwargs):
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if lookup is None:
+            return catalog_updated_at
+        try:
+            return (
+                self.get_queryset()
+                .filter(**{self.lookup_field: lookup})
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            return None
+
+
+class CatalogSnapshotMixin(CatalogCacheMixin):
+    # Отдельные записи каталога читаются из снимка в памяти (см.
+    # ordering_app.snapshot), если он собран для текущей версии каталога;
+    # устаревший или отсутствующий снимок означает обычное чтение из базы.
+    # ?fields= и ?expand= собираются из тех же записей снимка, а то, чего
+    # в снимке нет (неизвестные поля и т. п.), уходит в базу и сериализатор.
+    snapshot_section = None
+    # Раскрываемое поле -> секция снимка с его записями.
+    snapshot_expand = {}
+
+    def get_fieldsets(self):
+        return None, None
+
+    def get_snapshot(self):
+        snapshot = get_catalog_snapshot()
+        if snapshot is None or snapshot.version != getattr(self, "catalog_token", None):
+            return None
+        return snapshot
+
+    def get_snapshot_records(self, pks):
+        # {pk: запись} для найденных записей или None, если запрос нельзя
+        # обслужить снимком.
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        fields, expand = self.get_fieldsets()
+        expand = expand or []
+        if set(expand) - set(self.snapshot_expand):
+            return None
+
+        records = {}
+        for pk in pks:
+            record = snapshot.get(self.snapshot_section, pk)
+            if record is None:
+                continue
+            for name in expand:
+                section = self.snapshot_expand[name]
+                if section == "attributes":
+                    record[name] = snapshot.get(section, pk) or {}
+                elif record.get(name) is not None:
+                    record[name] = snapshot.get(section, record[name])
+            if fields is not None:
+                if set(fields) - set(record):
+                    return None
+                keep = set(fields) | set(expand)
+                record = {name: value for name, value in record.items() if name in keep}
+            records[pk] = record
+        return records
+
+    def get_snapshot_pk(self, **kwargs):
+        try:
+            return int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(request, self.snapshot_retrieve, *args, **kwargs)
+
+    def snapshot_retrieve(self, request, *args, **kwargs):
+        pk = self.get_snapshot_pk(**kwargs)
+        records = self.get_snapshot_records([pk]) if pk is not None else None
+        if not records:
+            return super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs)
+        return Response(records[pk])
+
+    def get_last_modified(self, request, catalog_updated_at, **kwargs):
+        pk = self.get_snapshot_pk(**kwargs)
+        snapshot = self.get_snapshot() if pk is not None else None
+        record = snapshot.get(self.snapshot_section, pk) if snapshot else None
+        if record is None:
+            return super().get_last_modified(request, catalog_updated_at, **kwargs)
+        return parse_datetime(record["updated_at"])
@@ -0,0 +1,190 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from ordering_app.documents import format_datetime
+
+
+def _identity(value):
+    return value
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if (
+        output_format is None
+        or output_format.lower() != ISO_8601
+        or getattr(field, "timezone", None) is not None
+    ):
+        return field.to_representation
+    # Часовой пояс подставляется при построении строк, см. ValuesPlan.rows.
+    return None
+
+
+def _field_converter(field):
+    # Порядок проверок важен: EmailField — подкласс CharField и т. п.
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        return _identity if field.pk_field is None else None
+    if isinstance(field, serializers.ChoiceField):
+        return field.to_representation
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.BooleanField):
+        return field.to_representation
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.DecimalField):
+        return field.to_representation
+    if isinstance(field, serializers.ReadOnlyField):
+        return _identity
+    raise TypeError(type(field).__name__)
+
+
+class ValuesPlan:
+    # Заранее собранный план сериализации: для каждого поля ModelSerializer
+    # запоминаются столбец для .values() и функция-конвертер, а ответ
+    # строится из словарей без создания экземпляров моделей и без обхода
+    # полей сериализатора на каждой строке. Результат совпадает с обычным
+    # сериализатором побайтно; поля, которые так собрать нельзя (вложенные
+    # объекты, SerializerMethodField и т. п.), делают план недоступным.
+
+    def __init__(self, model, columns, converters, datetime_fields, nested):
+        self.model = model
+        self.columns = columns
+        self.converters = converters
+        self.datetime_fields = datetime_fields
+        self.nested = nested
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        try:
+            return cls._compile(serializer)
+        except (TypeError, AttributeError, KeyError):
+            return None
+
+    @classmethod
+    def _compile(cls, serializer):
+        model = serializer.Meta.model
+        opts = model._meta
+        columns = []
+        converters = []
+        datetime_fields = []
+        nested = []
+        for field in serializer._readable_fields:
+            name = field.field_name
+            if field.source == "*" or len(field.source_attrs) != 1:
+                raise TypeError(name)
+            source = field.source_attrs[0]
+
+            if isinstance(field, serializers.ListSerializer):
+                child = cls._compile(field.child)
+                relation = opts.get_field(source)
+                if not relation.one_to_many:
+                    raise TypeError(name)
+                nested.append((name, relation.field.attname, child))
+                columns.append((name, None))
+                converters.append(None)
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                raise TypeError(name)
+
+            model_field = opts.get_field(source)
+            if not model_field.concrete:
+                raise TypeError(name)
+            columns.append((name, model_field.attname))
+            if isinstance(field, serializers.DateTimeField):
+                converter = _datetime_converter(field)
+                if converter is None:
+                    datetime_fields.append(name)
+                    converter = _identity
+            else:
+                converter = _field_converter(field)
+                if converter is None:
+                    raise TypeError(name)
+            converters.append(converter)
+
+        return cls(model, columns, converters, datetime_fields, nested)
+
+    def attnames(self):
+        attnames = [attname for _, attname in self.columns if attname is not None]
+        if self.nested:
+            attnames.append("pk")
+        return attnames
+
+    def values(self, queryset, extra=()):
+        # extra — дополнительные столбцы, например поле курсора пагинации.
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys([*self.attnames(), *extra])
+        )
+
+    def rows(self, values):
+        values = list(values)
+        tz = timezone.get_current_timezone() if self.datetime_fields else None
+        datetime_fields = set(self.datetime_fields)
+        nested = {
+            name: child.children(link, [row["pk"] for row in values])
+            for name, link, child in self.nested
+        }
+
+        rows = []
+        for row in values:
+            data = {}
+            for (name, attname), converter in zip(self.columns, self.converters):
+                if attname is None:
+                    data[name] = nested[name].get(row["pk"], [])
+                    continue
+                value = row[attname]
+                if value is None:
+                    data[name] = None
+                elif name in datetime_fields:
+                    data[name] = format_datetime(value, tz)
+                else:
+                    data[name] = converter(value)
+            rows.append(data)
+        return rows
+
+    def children(self, link, parent_ids):
+        # Вложенный список (например, позиции заказов) читается одним
+        # запросом для всех родительских строк страницы.
+        grouped = defaultdict(list)
+        if not parent_ids:
+            return grouped
+        values = list(
+            self.values(
+                self.model._default_manager.filter(**{f"{link}__in": parent_ids}),
+                extra=[link],
+            )
+        )
+        for parent, row in zip(values, self.rows(values)):
+            grouped[parent[link]].append(row)
+        return grouped
+
+
+class ValuesListMixin:
+    # Список отдаётся через ValuesPlan, если сериализатор это допускает;
+    # иначе (например, при ?expand=) — обычным ModelSerializer.
+    def get_values_plan(self):
+        if not settings.API_VALUES_FAST_PATH:
+            return None
+        return ValuesPlan.for_serializer(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_values_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Курсору нужны поля сортировки, даже если их нет в ?fields=.
+        ordering = getattr(self.paginator, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        values = plan.values(queryset, extra=[field.lstrip("-") for field in ordering])
+
+        page = self.paginate_queryset(values)
+        if page is not None:
+            return self.get_paginated_response(plan.rows(page))
+        return Response(plan.rows(values))
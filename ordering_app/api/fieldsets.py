@@ -0,0 +1,94 @@
+from django.db.models import Prefetch
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+
+
+def parse_fieldset(request, param):
+    value = request.query_params.get(param) if request is not None else None
+    if not value:
+        return None
+    return list(
+        dict.fromkeys(item.strip() for item in value.split(",") if item.strip())
+    )
+
+
+class SparseFieldsetSerializerMixin:
+    # ?fields=id,name,price оставляет в ответе только перечисленные поля,
+    # ?expand=supplier заменяет id связанного объекта вложенным
+    # представлением из expandable_fields. Параметры приходят через context,
+    # поэтому вложенные сериализаторы без context не затрагиваются.
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get("expand") or []
+        unknown = [name for name in expand if name not in self.expandable_fields]
+        if unknown:
+            raise ValidationError(
+                {"expand": f"Неизвестные поля: {', '.join(unknown)}."}
+            )
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name]()
+
+        requested = self.context.get("fields")
+        if requested is None:
+            return
+        unknown = [name for name in requested if name not in self.fields]
+        if unknown:
+            raise ValidationError(
+                {"fields": f"Неизвестные поля: {', '.join(unknown)}."}
+            )
+        for name in set(self.fields) - set(requested) - set(expand):
+            self.fields.pop(name)
+
+
+class SparseFieldsetMixin:
+    # Ограничение полей доходит до запроса: .only() читает только нужные
+    # столбцы, а раскрываемые связи из expand_related загружаются через
+    # select_related/prefetch_related фиксированным числом запросов.
+    expand_related = {}
+    # Связи, без которых поле нельзя отдать (например, items у заказа).
+    field_related = {}
+
+    def get_fieldsets(self):
+        if self.request is None or self.request.method not in permissions.SAFE_METHODS:
+            return None, None
+        return (
+            parse_fieldset(self.request, "fields"),
+            parse_fieldset(self.request, "expand"),
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"], context["expand"] = self.get_fieldsets()
+        return context
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+    def optimize_queryset(self, queryset):
+        fields, expand = self.get_fieldsets()
+        expand = [name for name in expand or [] if name in self.expand_related]
+        related = {name: self.expand_related[name] for name in expand}
+        for name, lookup in self.field_related.items():
+            if fields is None or name in fields:
+                related.setdefault(name, lookup)
+
+        if fields is not None:
+            # select_related по отложенному полю недопустим, поэтому связи
+            # подключаются заново только для того, что попадёт в ответ.
+            model_fields = {
+                field.name
+                for field in queryset.model._meta.concrete_fields
+                if not field.primary_key
+            }
+            queryset = queryset.select_related(None).only(
+                "pk", *sorted((set(fields) | set(expand)) & model_fields)
+            )
+        for name in sorted(related):
+            lookup = related[name]
+            if isinstance(lookup, Prefetch):
+                queryset = queryset.prefetch_related(lookup)
+            else:
+                queryset = queryset.select_related(lookup)
+        return queryset
@@ -0,0 +1,139 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from ordering_app.models import ProductAttribute, ProductAttributeValue
+
+
+def parse_id_list(value, name):
+    try:
+        return [int(item) for item in value.split(",") if item]
+    except ValueError:
+        raise ValidationError({name: "Ожидается список целых чисел через запятую."})
+
+
+def parse_decimal(value, name):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite():
+        raise ValidationError({name: "Ожидается число."})
+    return number
+
+
+def parse_attribute_filters(values):
+    filters = defaultdict(set)
+    for item in values:
+        name, separator, value = item.partition(":")
+        if not separator or not name:
+            raise ValidationError(
+                {"attr": "Ожидается формат attr=<атрибут>:<значение>."}
+            )
+        filters[name].add(value)
+    return filters
+
+
+def parse_attribute_ranges(params):
+    # attr_gte=Диагональ (дюйм):6&attr_lte=Диагональ (дюйм):6.5 -> одна
+    # граница на атрибут и сторону, обе попадают в один диапазон индекса.
+    ranges = defaultdict(dict)
+    for param, lookup in (("attr_gte", "gte"), ("attr_lte", "lte")):
+        for item in params.getlist(param):
+            name, separator, value = item.rpartition(":")
+            if not separator or not name:
+                raise ValidationError(
+                    {param: f"Ожидается формат {param}=<атрибут>:<число>."}
+                )
+            bound = float(parse_decimal(value, param))
+            current = ranges[name].get(lookup)
+            if current is not None:
+                bound = max(bound, current) if lookup == "gte" else min(bound, current)
+            ranges[name][lookup] = bound
+    return ranges
+
+
+class ProductCatalogFilter(BaseFilterBackend):
+    # ?category=1,2&supplier=3&price_min=100&price_max=500&attr=Цвет:красный
+    # &attr_gte=Встроенная память (Гб):256
+    # Значения одного атрибута объединяются через ИЛИ, разные атрибуты и
+    # остальные параметры — через И.
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if params.get("category"):
+            queryset = queryset.filter(
+                category_id__in=parse_id_list(params["category"], "category")
+            )
+        if params.get("supplier"):
+            queryset = queryset.filter(
+                supplier_id__in=parse_id_list(params["supplier"], "supplier")
+            )
+        if params.get("price_min"):
+            queryset = queryset.filter(
+                price__gte=parse_decimal(params["price_min"], "price_min")
+            )
+        if params.get("price_max"):
+            queryset = queryset.filter(
+                price__lte=parse_decimal(params["price_max"], "price_max")
+            )
+
+        attribute_filters = parse_attribute_filters(params.getlist("attr"))
+        attribute_ranges = parse_attribute_ranges(params)
+        if attribute_filters or attribute_ranges:
+            attribute_ids = dict(
+                ProductAttribute.objects.filter(
+                    name__in=[*attribute_filters, *attribute_ranges]
+                ).values_list("name", "id")
+            )
+            conditions = [
+                (name, {"value__in": values})
+                for name, values in attribute_filters.items()
+            ] + [
+                (
+                    name,
+                    {
+                        f"numeric_value__{lookup}": bound
+                        for lookup, bound in bounds.items()
+                    },
+                )
+                for name, bounds in attribute_ranges.items()
+            ]
+            for name, lookups in conditions:
+                if name not in attribute_ids:
+                    return queryset.none()
+                queryset = queryset.filter(
+                    pk__in=ProductAttributeValue.objects.filter(
+                        attribute_id=attribute_ids[name], **lookups
+                    ).values("product_id")
+                )
+        return queryset
+
+
+def product_facets(queryset, limit=None):
+    values = ProductAttributeValue.objects.all()
+    # Без фильтров подзапрос по товарам не нужен: счётчики строятся
+    # прямо по индексу (attribute, value, product).
+    if queryset.query.has_filters():
+        values = values.filter(product__in=queryset.values("pk"))
+    counts = (
+        values.values("attribute_id", "value")
+        .annotate(count=Count("product_id"))
+        .order_by("attribute_id", "value")
+    )
+    names = dict(ProductAttribute.objects.values_list("id", "name"))
+    facets = defaultdict(list)
+    for row in counts:
+        facets[names[row["attribute_id"]]].append(
+            {"value": row["value"], "count": row["count"]}
+        )
+    if limit:
+        for name, items in facets.items():
+            if len(items) > limit:
+                items.sort(key=lambda item: -item["count"])
+                facets[name] = items[:limit]
+    return dict(sorted(facets.items()))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    # Курсор по первичному ключу: каждая страница — это WHERE id > ... LIMIT n
+    # по индексу, поэтому её стоимость не зависит от номера страницы.
+    ordering = "id"
+    page_size = getattr(settings, "CATALOG_PAGE_SIZE", 50)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "CATALOG_MAX_PAGE_SIZE", 500)
+
+
+class ProductDocumentPagination(CatalogCursorPagination):
+    ordering = "product_id"
+
+
+class CatalogSearchPagination(LimitOffsetPagination):
+    # Результаты поиска упорядочены по релевантности, а не по ключу,
+    # поэтому курсор здесь неприменим: страницы задаются limit/offset.
+    default_limit = getattr(settings, "CATALOG_PAGE_SIZE", 50)
+    max_limit = getattr(settings, "CATALOG_MAX_PAGE_SIZE", 500)
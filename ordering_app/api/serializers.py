@@ -1,6 +1,11 @@
+from decimal import Decimal
+
+from django.conf import settings
 from rest_framework import serializers
+from ordering_app.carts import MAX_ITEM_QUANTITY
 from ordering_app.models import (
     Product,
+    ProductDocument,
     Supplier,
     Category,
     Cart,
@@ -13,13 +18,45 @@ from django.contrib.auth import get_user_model
 from django.db import transaction
 from ordering_app.utils import send_order_confirmation
 
+from .fieldsets import SparseFieldsetSerializerMixin
+
 User = get_user_model()
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductAttributesField(serializers.Field):
+    # Атрибуты товара словарём {название: значение}, как в документах товаров.
+    def __init__(self, **kwargs):
+        kwargs.setdefault("source", "attribute_values")
+        kwargs.setdefault("read_only", True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return {
+            attr_value.attribute.name: attr_value.value
+            for attr_value in sorted(value.all(), key=lambda item: item.attribute.name)
+        }
+
+
+class ProductSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        "supplier": lambda: SupplierSerializer(read_only=True),
+        "category": lambda: CategorySerializer(read_only=True),
+        "attributes": ProductAttributesField,
+    }
+
     class Meta:
         model = Product
-        fields = "__all__"
+        # import_hash — служебное поле пакетного импорта.
+        exclude = ["import_hash"]
+
+
+class ProductDocumentSerializer(serializers.BaseSerializer):
+    # Документ уже собран при записи и отдаётся как есть.
+    class Meta:
+        model = ProductDocument
+
+    def to_representation(self, instance):
+        return instance.data
 
 
 class SupplierSerializer(serializers.ModelSerializer):
@@ -62,10 +99,11 @@ class CartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), write_only=True, source="product"
     )
+    product = ProductSerializer(read_only=True)
 
     class Meta:
         model = CartItem
-        fields = ["id", "cart", "product_id", "quantity"]
+        fields = ["id", "cart", "product_id", "product", "quantity"]
         read_only_fields = ["cart"]
 
     def create(self, validated_data):
@@ -97,6 +135,50 @@ class CartItemSerializer(serializers.ModelSerializer):
         return instance
 
 
+class CartBatchOperationSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(
+        min_value=0, max_value=MAX_ITEM_QUANTITY, required=False
+    )
+    delta = serializers.IntegerField(
+        min_value=-MAX_ITEM_QUANTITY, max_value=MAX_ITEM_QUANTITY, required=False
+    )
+
+    def validate(self, attrs):
+        if ("quantity" in attrs) == ("delta" in attrs):
+            raise serializers.ValidationError("Укажите либо quantity, либо delta.")
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    # Товары всех операций проверяются одним запросом id__in вместо
+    # PrimaryKeyRelatedField на каждую позицию.
+    operations = serializers.ListField(
+        child=CartBatchOperationSerializer(),
+        allow_empty=False,
+        max_length=settings.CART_BATCH_MAX_OPERATIONS,
+    )
+
+    def validate_operations(self, operations):
+        product_ids = {operation["product_id"] for operation in operations}
+        found = set(
+            Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True)
+        )
+        missing = sorted(product_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                f"Товары не найдены: {', '.join(map(str, missing))}."
+            )
+        return [
+            (
+                operation["product_id"],
+                operation.get("quantity"),
+                operation.get("delta"),
+            )
+            for operation in operations
+        ]
+
+
 class CartSerializer(serializers.ModelSerializer):
     items = serializers.SerializerMethodField()
     total_amount = serializers.DecimalField(
@@ -108,28 +190,30 @@ class CartSerializer(serializers.ModelSerializer):
         fields = ["id", "user", "created_at", "updated_at", "items", "total_amount"]
         read_only_fields = ["user", "created_at", "updated_at"]
 
+    def get_cart_items(self, obj):
+        # Позиции вместе с товарами и суммами (CartItem.objects.with_totals()).
+        # CartDetailView подгружает их заранее в priced_items, иначе они
+        # читаются здесь одним запросом.
+        if not hasattr(obj, "priced_items"):
+            obj.priced_items = list(obj.items.with_totals().order_by("id"))
+        return obj.priced_items
+
     def get_items(self, obj):
-        items_data = []
-        for item in obj.items.all():
-            if item.product:
-                item_data = {
-                    "id": item.id,
-                    "quantity": item.quantity,
-                    "product": ProductSerializer(item.product).data,
-                    "item_total": item.get_item_total(),
-                }
-                items_data.append(item_data)
-            else:
-                pass
-        return items_data
+        items = self.get_cart_items(obj)
+        products = ProductSerializer([item.product for item in items], many=True).data
+        return [
+            {
+                "id": item.id,
+                "quantity": item.quantity,
+                "product": product,
+                "item_total": item.line_total,
+            }
+            for item, product in zip(items, products)
+        ]
 
     def get_total_amount(self, obj):
-        total = sum(
-            item.quantity * item.product.price
-            for item in obj.items.all()
-            if item.product
-        )
-        return total
+        items = self.get_cart_items(obj)
+        return items[0].cart_total if items else Decimal("0.00")
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -156,7 +240,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     cart_id = serializers.IntegerField(write_only=True, required=True)
 
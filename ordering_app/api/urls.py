@@ -6,6 +6,9 @@ from . import views
 router = DefaultRouter()
 
 router.register(r"products", views.ProductViewSet, basename="product")
+router.register(
+    r"product-documents", views.ProductDocumentViewSet, basename="product-document"
+)
 router.register(r"categories", views.CategoryViewSet, basename="category")
 router.register(r"suppliers", views.SupplierViewSet, basename="supplier")
 router.register(r"cart/items", views.CartItemViewSet, basename="cart-item")
@@ -16,4 +19,7 @@ urlpatterns = [
     path("register/", views.RegisterView.as_view(), name="register"),
     path("login/", views.LoginView.as_view(), name="login"),
     path("cart/", views.CartDetailView.as_view(), name="cart-detail"),
+    path("cart/guest/", views.GuestCartView.as_view(), name="cart-guest"),
+    path("cart/summary/", views.CartSummaryView.as_view(), name="cart-summary"),
+    path("autocomplete/", views.AutocompleteView.as_view(), name="autocomplete"),
 ]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -6,10 +8,16 @@ from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F, Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
 from ordering_app.models import (
     Product,
+    ProductAttributeValue,
+    ProductDocument,
     Supplier,
     Category,
     Cart,
@@ -19,18 +27,49 @@ from ordering_app.models import (
     OrderItem,
 )
 
+from .caching import CatalogCacheMixin, CatalogSnapshotMixin
+from .fastpath import ValuesListMixin
+from .fieldsets import SparseFieldsetMixin
+from .filters import ProductCatalogFilter, parse_id_list, product_facets
+from .pagination import (
+    CatalogCursorPagination,
+    CatalogSearchPagination,
+    ProductDocumentPagination,
+)
 from .serializers import (
     ProductSerializer,
+    ProductDocumentSerializer,
     SupplierSerializer,
     CategorySerializer,
     RegisterSerializer,
     UserSerializer,
     CartSerializer,
+    CartBatchSerializer,
     CartItemSerializer,
     OrderSerializer,
     OrderItemSerializer,
 )
 
+from ordering_app.autocomplete import get_autocomplete_index
+from ordering_app.carts import (
+    CartQuantityError,
+    add_cart_item,
+    apply_cart_operations,
+    check_cart_subtotal,
+    max_cart_subtotal,
+    refresh_carts,
+)
+from ordering_app.export import EXPORT_FORMATS, export_products, parse_since
+from ordering_app.guest_carts import (
+    apply_guest_operations,
+    cart_key,
+    get_request_token,
+    issue_token,
+    load_items,
+    merge_guest_cart,
+    save_items,
+)
+from ordering_app.search import ProductSearch
 from ordering_app.utils import send_registration_confirmation, send_order_confirmation
 
 User = get_user_model()
@@ -40,6 +79,7 @@ class ProductListView(generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogCursorPagination
 
 
 class ProductDetailView(generics.RetrieveAPIView):
@@ -48,6 +88,28 @@ class ProductDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
+class AutocompleteView(generics.GenericAPIView):
+    # Подсказки строятся по индексу в памяти процесса, без запросов к базе;
+    # аутентификация не нужна и тоже не должна обращаться к ней.
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(
+                request.query_params.get("limit", settings.CATALOG_AUTOCOMPLETE_LIMIT)
+            )
+        except ValueError:
+            return Response(
+                {"limit": "Ожидается целое число."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(0, min(limit, settings.CATALOG_AUTOCOMPLETE_MAX_LIMIT))
+        index = get_autocomplete_index()
+        return Response(
+            {"results": index.suggest(request.query_params.get("q", ""), limit)}
+        )
+
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
@@ -60,6 +122,7 @@ class RegisterView(generics.CreateAPIView):
         Customer.objects.get_or_create(user=user)
         send_registration_confirmation(user)
         token, created = Token.objects.get_or_create(user=user)
+        merge_guest_cart(get_request_token(request), user)
         headers = self.get_success_headers(serializer.data)
         response_data = {
             "message": "Пользователь успешно зарегистрирован.",
@@ -79,6 +142,7 @@ class LoginView(ObtainAuthToken):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data["user"]
         token, created = Token.objects.get_or_create(user=user)
+        merge_guest_cart(get_request_token(request), user)
         response_data = {
             "message": "Пользователь успешно вошел.",
             "user": UserSerializer(user).data,
@@ -87,16 +151,28 @@ class LoginView(ObtainAuthToken):
         return Response(response_data)
 
 
+def get_cart_with_items(user):
+    # Корзина, позиции с товарами и суммы — два запроса при любом
+    # количестве позиций.
+    return (
+        Cart.objects.prefetch_related(
+            Prefetch(
+                "items",
+                queryset=CartItem.objects.with_totals().order_by("id"),
+                to_attr="priced_items",
+            )
+        )
+        .filter(user=user)
+        .first()
+    )
+
+
 class CartDetailView(generics.RetrieveAPIView):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        try:
-            cart = Cart.objects.get(user=self.request.user)
-            return cart
-        except Cart.DoesNotExist:
-            return None
+        return get_cart_with_items(self.request.user)
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -116,16 +192,114 @@ class CartDetailView(generics.RetrieveAPIView):
         return Response(serializer.data)
 
 
+class CartSummaryView(generics.GenericAPIView):
+    # Значок корзины: количество и сумма из одной строки Cart, без чтения
+    # позиций и товаров.
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        summary = (
+            Cart.objects.filter(user=request.user)
+            .values("item_count", "subtotal")
+            .first()
+        ) or {"item_count": 0, "subtotal": Decimal("0.00")}
+        return Response(
+            {
+                "item_count": summary["item_count"],
+                "subtotal": f"{summary['subtotal']:.2f}",
+            }
+        )
+
+
+class GuestCartView(generics.GenericAPIView):
+    # Корзина без регистрации: позиции лежат в кэше GUEST_CART_CACHE_ALIAS
+    # под подписанным токеном (заголовок X-Cart-Token), а не в базе. При
+    # входе или регистрации с этим токеном они переносятся в корзину
+    # пользователя.
+    serializer_class = CartBatchSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        token = get_request_token(request)
+        if cart_key(token) is None:
+            token = None
+        return Response(self.get_cart_data(token, load_items(token)))
+
+    def post(self, request, *args, **kwargs):
+        # Те же операции, что у /api/cart/items/batch/. Без действующего
+        # токена выдаётся новый — он возвращается в ответе.
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = get_request_token(request)
+        if cart_key(token) is None:
+            token = issue_token()
+        try:
+            items = apply_guest_operations(
+                load_items(token), serializer.validated_data["operations"]
+            )
+        except CartQuantityError as e:
+            raise serializers.ValidationError({"operations": str(e)})
+        if len(items) > settings.GUEST_CART_MAX_ITEMS:
+            raise serializers.ValidationError(
+                {
+                    "operations": f"В корзине может быть не больше "
+                    f"{settings.GUEST_CART_MAX_ITEMS} товаров."
+                }
+            )
+        data = self.get_cart_data(token, items)
+        # Гостевая корзина должна поместиться в корзину пользователя.
+        if Decimal(data["total_amount"]) > max_cart_subtotal():
+            raise serializers.ValidationError(
+                {
+                    "operations": f"Сумма корзины не может превышать "
+                    f"{max_cart_subtotal()}."
+                }
+            )
+        save_items(token, items)
+        return Response(data)
+
+    def get_cart_data(self, token, items):
+        products = {
+            product.pk: product
+            for product in Product.objects.filter(pk__in=list(items))
+        }
+        # Товары, удалённые из каталога, в ответ не попадают.
+        lines = [
+            (products[product_id], quantity)
+            for product_id, quantity in items.items()
+            if product_id in products
+        ]
+        data = ProductSerializer([product for product, _ in lines], many=True).data
+        total = Decimal("0.00")
+        result = []
+        for (product, quantity), product_data in zip(lines, data):
+            item_total = product.price * quantity
+            total += item_total
+            result.append(
+                {
+                    "quantity": quantity,
+                    "product": product_data,
+                    "item_total": f"{item_total:.2f}",
+                }
+            )
+        return {"token": token, "items": result, "total_amount": f"{total:.2f}"}
+
+
 class CartItemViewSet(viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart__user=self.request.user)
+        return CartItem.objects.filter(cart__user=self.request.user).select_related(
+            "product"
+        )
+
+    # Каждое изменение позиций в той же транзакции пересчитывает сводку
+    # корзины (item_count, subtotal) для /api/cart/summary/.
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
         product = serializer.validated_data.get("product")
         quantity = serializer.validated_data.get("quantity", 1)
 
@@ -136,31 +310,56 @@ class CartItemViewSet(viewsets.ModelViewSet):
                 {"quantity": "Quantity must be positive."}
             )
 
-        cart_item, item_created = CartItem.objects.get_or_create(
+        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        try:
+            add_cart_item(cart.pk, product.pk, quantity)
+            refresh_carts([cart.pk], updated_at=timezone.now())
+            check_cart_subtotal(cart.pk)
+        except CartQuantityError as e:
+            raise serializers.ValidationError({"quantity": str(e)})
+        serializer.instance = CartItem.objects.select_related("product").get(
             cart=cart, product=product
         )
 
-        if not item_created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-        cart_item.save()
-        serializer.instance = cart_item
-        cart.save()
-
+    @transaction.atomic
     def perform_update(self, serializer):
         instance = serializer.instance
         quantity = serializer.validated_data.get("quantity", instance.quantity)
 
         if quantity <= 0:
             instance.delete()
+            refresh_carts([instance.cart_id], updated_at=timezone.now())
             return None
         else:
             instance.quantity = quantity
-            instance.save()
-            instance.cart.save()
+            instance.save(update_fields=["quantity"])
+            refresh_carts([instance.cart_id], updated_at=timezone.now())
+            try:
+                check_cart_subtotal(instance.cart_id)
+            except CartQuantityError as e:
+                raise serializers.ValidationError({"quantity": str(e)})
             return instance
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        refresh_carts([instance.cart_id])
+
+    @action(detail=False, methods=["post"], serializer_class=CartBatchSerializer)
+    def batch(self, request):
+        # {"operations": [{"product_id": 1, "quantity": 3},
+        #                 {"product_id": 2, "delta": -1}]}
+        # Все операции применяются в одной транзакции, в ответе — корзина.
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                cart, created = Cart.objects.get_or_create(user=request.user)
+                apply_cart_operations(cart, serializer.validated_data["operations"])
+        except CartQuantityError as e:
+            raise serializers.ValidationError({"operations": str(e)})
+        return Response(CartSerializer(get_cart_with_items(request.user)).data)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -181,15 +380,18 @@ class CartItemViewSet(viewsets.ModelViewSet):
         return Response(CartItemSerializer(updated_instance).data)
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsetMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Order.objects.none()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    field_related = {"items": Prefetch("items")}
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            return Order.objects.filter(user=user).select_related("user", "customer")
+            return self.optimize_queryset(
+                Order.objects.filter(user=user).select_related("user", "customer")
+            )
         return Order.objects.none()
 
     def retrieve(self, request, *args, **kwargs):
@@ -247,19 +449,191 @@ class OrderViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(
+    SparseFieldsetMixin,
+    CatalogSnapshotMixin,
+    ValuesListMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogCursorPagination
+    filter_backends = [ProductCatalogFilter]
+    snapshot_section = "products"
+    snapshot_expand = {
+        "supplier": "suppliers",
+        "category": "categories",
+        "attributes": "attributes",
+    }
+    expand_related = {
+        "supplier": "supplier",
+        "category": "category",
+        "attributes": Prefetch(
+            "attribute_values",
+            queryset=ProductAttributeValue.objects.select_related("attribute"),
+        ),
+    }
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["facets"] = product_facets(
+            self.filter_queryset(self.get_queryset()),
+            limit=settings.CATALOG_FACET_LIMIT,
+        )
+        return response
+
+    @action(detail=False, methods=["get"])
+    def bulk(self, request):
+        return self.catalog_response(request, self._bulk)
+
+    def _bulk(self, request):
+        # /api/products/bulk/?ids=1,2,3&skus=A-1,B-2 — одна выборка по
+        # id__in/sku__in вместо запроса на каждую строку корзины или заказа.
+        # Товары идут в порядке запроса, ненайденные id и артикулы
+        # перечисляются в missing.
+        ids = list(
+            dict.fromkeys(parse_id_list(request.query_params.get("ids", ""), "ids"))
+        )
+        skus = list(
+            dict.fromkeys(
+                sku.strip()
+                for sku in request.query_params.get("skus", "").split(",")
+                if sku.strip()
+            )
+        )
+        if not ids and not skus:
+            return Response(
+                {"ids": "Укажите ids или skus."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = settings.CATALOG_BULK_MAX_ITEMS
+        if len(ids) + len(skus) > limit:
+            return Response(
+                {"ids": f"Не больше {limit} id и артикулов за запрос."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        records = None if skus else self.get_snapshot_records(ids)
+        if records is not None:
+            return Response(
+                {
+                    "results": [records[pk] for pk in ids if pk in records],
+                    "missing": {
+                        "ids": [pk for pk in ids if pk not in records],
+                        "skus": [],
+                    },
+                }
+            )
+
+        queryset = self.get_queryset().filter(Q(pk__in=ids) | Q(sku__in=skus))
+        plan = self.get_values_plan()
+        if plan is not None:
+            rows = list(plan.values(queryset, extra=["id", "sku"]))
+            keys = [(row["id"], row["sku"]) for row in rows]
+            data = plan.rows(rows)
+        else:
+            # sku может быть отложен через ?fields=, поэтому читается
+            # отдельной аннотацией.
+            products = list(queryset.annotate(bulk_sku=F("sku")))
+            keys = [(product.pk, product.bulk_sku) for product in products]
+            data = self.get_serializer(products, many=True).data
+
+        by_id = {}
+        by_sku = {}
+        for (pk, sku), item in zip(keys, data):
+            by_id[pk] = item
+            by_sku.setdefault(sku, []).append(pk)
+
+        found = [pk for pk in ids if pk in by_id]
+        for sku in skus:
+            found.extend(by_sku.get(sku, []))
+        return Response(
+            {
+                "results": [by_id[pk] for pk in dict.fromkeys(found)],
+                "missing": {
+                    "ids": [pk for pk in ids if pk not in by_id],
+                    "skus": [sku for sku in skus if sku not in by_sku],
+                },
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        # Весь каталог потоком NDJSON или CSV (?output=csv), без сборки
+        # списка в памяти. ?since=<ISO 8601> отдаёт только товары, изменённые
+        # с этого момента; X-Export-Started-At подходит как since для
+        # следующей выгрузки.
+        output_format = request.query_params.get("output", "ndjson")
+        if output_format not in EXPORT_FORMATS:
+            return Response(
+                {"output": f"Допустимые форматы: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        since = None
+        if request.query_params.get("since"):
+            try:
+                since = parse_since(request.query_params["since"])
+            except ValueError:
+                since = None
+            if since is None:
+                return Response(
+                    {"since": "Ожидается дата и время в формате ISO 8601."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        started_at = timezone.now()
+        response = StreamingHttpResponse(
+            export_products(output_format, since=since),
+            content_type=EXPORT_FORMATS[output_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="products.{output_format}"'
+        )
+        response["X-Export-Started-At"] = started_at.isoformat()
+        return response
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        return self.catalog_response(request, self._search)
+
+    def _search(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"q": "Укажите поисковый запрос."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        paginator = CatalogSearchPagination()
+        page = paginator.paginate_queryset(
+            ProductSearch(query, queryset=self.get_queryset()), request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ProductDocumentViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
+    # Товары вместе с поставщиком, категорией и атрибутами одним запросом
+    # к таблице документов, без JOIN.
+    queryset = ProductDocument.objects.all()
+    serializer_class = ProductDocumentSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ProductDocumentPagination
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(
+    CatalogSnapshotMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet
+):
+    snapshot_section = "categories"
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogCursorPagination
 
 
-class SupplierViewSet(viewsets.ReadOnlyModelViewSet):
+class SupplierViewSet(
+    CatalogSnapshotMixin, ValuesListMixin, viewsets.ReadOnlyModelViewSet
+):
+    snapshot_section = "suppliers"
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogCursorPagination
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OrderingAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ordering_app"
+
+    def ready(self):
+        from ordering_app import signals  # noqa: F401
@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+from ordering_app.catalog import get_catalog_version
+from ordering_app.models import Category, Product, Supplier
+
+# Порядок типов при одинаковом совпадении: сначала категории и поставщики,
+# их немного и они ведут к целым разделам каталога.
+KINDS = ("category", "supplier", "product")
+
+OFFSET_BITS = 8
+MAX_OFFSET = (1 << OFFSET_BITS) - 1
+
+WORD_START = re.compile(r"\w+")
+
+
+def normalize(text):
+    return " ".join(text.casefold().replace("ё", "е").split())
+
+
+class AutocompleteIndex:
+    # Отсортированный массив ссылок на позиции начала слов в названиях:
+    # ссылка — это (номер записи << 8) | смещение, ключом служит хвост
+    # нормализованного названия с этого слова. Сами хвосты не хранятся,
+    # bisect строит их на лету, так что на каждое слово приходится восемь
+    # байт массива. Запрос "iphone xs" — это двоичный поиск диапазона
+    # хвостов с таким префиксом и чтение первых N записей из него.
+
+    def __init__(self, entries, version=None):
+        self.version = version
+        self.kinds = array("B")
+        self.ids = array("Q")
+        self.names = []
+        self.texts = []
+        refs = []
+        keys = []
+        for kind, pk, name in entries:
+            text = normalize(name)
+            if not text:
+                continue
+            entry = len(self.names)
+            self.kinds.append(KINDS.index(kind))
+            self.ids.append(pk)
+            self.names.append(name)
+            self.texts.append(text)
+            for match in WORD_START.finditer(text):
+                if match.start() > MAX_OFFSET:
+                    break
+                refs.append((entry << OFFSET_BITS) | match.start())
+                keys.append(text[match.start() :])
+        # Сортировка устойчивая, а записи добавлялись в порядке KINDS,
+        # поэтому при равных хвостах категории и поставщики идут первыми.
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.refs = array("Q", (refs[position] for position in order))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _key(self, ref):
+        return self.texts[ref >> OFFSET_BITS][ref & MAX_OFFSET :]
+
+    def suggest(self, query, limit=10):
+        prefix = normalize(query)
+        match = WORD_START.search(prefix)
+        if match is None or limit <= 0:
+            return []
+        prefix = prefix[match.start() :]
+
+        position = bisect_left(self.refs, prefix, key=self._key)
+        results = []
+        seen = set()
+        refs = self.refs
+        while position < len(refs) and len(results) < limit:
+            ref = refs[position]
+            position += 1
+            if not self._key(ref).startswith(prefix):
+                break
+            entry = ref >> OFFSET_BITS
+            if entry in seen:
+                continue
+            seen.add(entry)
+            results.append(
+                {
+                    "type": KINDS[self.kinds[entry]],
+                    "id": self.ids[entry],
+                    "name": self.names[entry],
+                }
+            )
+        return results
+
+
+def load_entries():
+    for kind, model in (
+        ("category", Category),
+        ("supplier", Supplier),
+        ("product", Product),
+    ):
+        for pk, name in model.objects.values_list("pk", "name").iterator(
+            chunk_size=5000
+        ):
+            yield kind, pk, name
+
+
+_index = None
+_checked_at = 0.0
+_rebuild_lock = threading.Lock()
+
+
+def get_autocomplete_index():
+    # Индекс живёт в памяти процесса и перестраивается, когда меняется
+    # версия каталога. Версия проверяется не чаще раза в
+    # CATALOG_AUTOCOMPLETE_REFRESH_INTERVAL секунд; пока один поток
+    # перестраивает индекс, остальные отвечают по предыдущему.
+    global _index, _checked_at
+
+    index = _index
+    now = time.monotonic()
+    if (
+        index is not None
+        and now - _checked_at < settings.CATALOG_AUTOCOMPLETE_REFRESH_INTERVAL
+    ):
+        return index
+
+    version = get_catalog_version()
+    _checked_at = now
+    if index is not None and index.version == version:
+        return index
+
+    if not _rebuild_lock.acquire(blocking=index is None):
+        return index
+    try:
+        if _index is None or _index.version != version:
+            _index = AutocompleteIndex(load_entries(), version=version)
+        return _index
+    finally:
+        _rebuild_lock.release()
@@ -0,0 +1,168 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    DecimalField,
+    F,
+    OuterRef,
+    PositiveIntegerField,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ordering_app.models import Cart, CartItem, cart_line_total
+
+# Верхняя граница CartItem.quantity (PositiveIntegerField) во всех
+# поддерживаемых базах.
+MAX_ITEM_QUANTITY = 2147483647
+
+
+class CartQuantityError(ValueError):
+    pass
+
+
+def _items_sum(expression, output_field, empty):
+    return Coalesce(
+        Subquery(
+            CartItem.objects.filter(cart=OuterRef("pk"))
+            .order_by()
+            .values("cart")
+            .annotate(total=Sum(expression))
+            .values("total"),
+            output_field=output_field,
+        ),
+        Value(empty, output_field=output_field),
+    )
+
+
+def refresh_cart_summaries(carts, **fields):
+    # Количество единиц товара и сумма пересчитываются одним UPDATE с
+    # подзапросами по позициям, поэтому итог всегда совпадает с позициями
+    # на момент записи, а не накапливает ошибки приращений. fields —
+    # дополнительные столбцы того же UPDATE (например, updated_at).
+    return carts.update(
+        **fields,
+        item_count=_items_sum("quantity", PositiveIntegerField(), 0),
+        subtotal=_items_sum(
+            cart_line_total(),
+            DecimalField(max_digits=12, decimal_places=2),
+            Decimal("0.00"),
+        ),
+    )
+
+
+def refresh_carts(cart_ids, **fields):
+    cart_ids = list(cart_ids)
+    if not cart_ids:
+        return 0
+    return refresh_cart_summaries(Cart.objects.filter(pk__in=cart_ids), **fields)
+
+
+def refresh_carts_for_products(product_ids):
+    # После изменения цен: только корзины, где есть эти товары.
+    return refresh_cart_summaries(
+        Cart.objects.filter(
+            pk__in=CartItem.objects.filter(product_id__in=list(product_ids)).values(
+                "cart_id"
+            )
+        )
+    )
+
+
+def add_cart_item(cart_id, product_id, quantity):
+    # UPDATE ... SET quantity = quantity + n: повторное добавление — один
+    # запрос, и одновременные добавления складываются в самой базе, а не
+    # перезаписывают друг друга. Если позиции ещё нет, она вставляется в
+    # точке сохранения; проигравший гонку за уникальную пару (cart, product)
+    # получает IntegrityError и прибавляет к уже вставленной строке.
+    # Прибавка, после которой количество превысило бы MAX_ITEM_QUANTITY, не
+    # обновляет ни одной строки и отклоняется.
+    error = CartQuantityError(
+        f"Количество товара {product_id} не может превышать {MAX_ITEM_QUANTITY}."
+    )
+    if quantity > MAX_ITEM_QUANTITY:
+        raise error
+    items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+    fitting = items.filter(quantity__lte=MAX_ITEM_QUANTITY - quantity)
+    if fitting.update(quantity=F("quantity") + quantity):
+        return
+    if items.exists():
+        raise error
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(
+                cart_id=cart_id, product_id=product_id, quantity=quantity
+            )
+    except IntegrityError:
+        if not fitting.update(quantity=F("quantity") + quantity):
+            raise error
+
+
+def apply_cart_operations(cart, operations):
+    # operations — список (product_id, quantity, delta) в порядке запроса:
+    # quantity задаёт количество, delta прибавляет к текущему; результат
+    # не больше нуля удаляет позицию. Текущие позиции читаются одним
+    # запросом (с блокировкой строк, где база это умеет), изменения
+    # записываются bulk_create/bulk_update/delete, сводка — одним UPDATE.
+    product_ids = {product_id for product_id, _, _ in operations}
+    items = {
+        item.product_id: item
+        for item in CartItem.objects.select_for_update().filter(
+            cart=cart, product_id__in=product_ids
+        )
+    }
+    quantities = {product_id: item.quantity for product_id, item in items.items()}
+    for product_id, quantity, delta in operations:
+        if quantity is None:
+            quantity = quantities.get(product_id, 0) + delta
+        if quantity > MAX_ITEM_QUANTITY:
+            raise CartQuantityError(
+                f"Количество товара {product_id} не может превышать "
+                f"{MAX_ITEM_QUANTITY}."
+            )
+        quantities[product_id] = quantity
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    for product_id, quantity in quantities.items():
+        item = items.get(product_id)
+        if quantity <= 0:
+            if item is not None:
+                to_delete.append(item.pk)
+        elif item is None:
+            to_create.append(
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            )
+        elif item.quantity != quantity:
+            item.quantity = quantity
+            to_update.append(item)
+
+    if to_create:
+        CartItem.objects.bulk_create(to_create)
+    if to_update:
+        CartItem.objects.bulk_update(to_update, ["quantity"])
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
+    refresh_carts([cart.pk], updated_at=timezone.now())
+    check_cart_subtotal(cart.pk)
+
+
+def max_cart_subtotal():
+    field = Cart._meta.get_field("subtotal")
+    return (
+        Decimal(10) ** (field.max_digits - field.decimal_places)
+        - Decimal(10) ** -field.decimal_places
+    )
+
+
+def check_cart_subtotal(cart_id):
+    # Допустимое по количеству изменение может не поместиться в сумму
+    # корзины (Cart.subtotal): такую корзину уже нельзя прочитать, поэтому
+    # изменение отклоняется, и вызывающий откатывает транзакцию.
+    limit = max_cart_subtotal()
+    if Cart.objects.filter(pk=cart_id, subtotal__gt=limit).exists():
+        raise CartQuantityError(f"Сумма корзины не может превышать {limit}.")
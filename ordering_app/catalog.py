@@ -0,0 +1,36 @@
+from django.db.models import F
+from django.utils import timezone
+
+from ordering_app.models import CatalogState
+
+CATALOG_STATE_ID = 1
+
+
+def get_catalog_state():
+    state = (
+        CatalogState.objects.filter(pk=CATALOG_STATE_ID)
+        .values_list("version", "updated_at")
+        .first()
+    )
+    if state is None:
+        catalog_state, _ = CatalogState.objects.get_or_create(pk=CATALOG_STATE_ID)
+        state = (catalog_state.version, catalog_state.updated_at)
+    return state
+
+
+def get_catalog_version():
+    return catalog_version_token(*get_catalog_state())
+
+
+def catalog_version_token(version, updated_at):
+    # Версия дополняется временем изменения: номер версии сам по себе может
+    # повториться, например, после восстановления базы из резервной копии.
+    return f"{version}.{int(updated_at.timestamp() * 1_000_000)}"
+
+
+def bump_catalog_version():
+    updated = CatalogState.objects.filter(pk=CATALOG_STATE_ID).update(
+        version=F("version") + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogState.objects.get_or_create(pk=CATALOG_STATE_ID, defaults={"version": 1})
@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.utils import timezone
+
+from ordering_app.models import Product, ProductAttributeValue, ProductDocument
+
+DOCUMENT_BATCH_SIZE = 500
+
+
+def format_datetime(value, tz):
+    # Тот же формат, что у DateTimeField в ответах API, но часовой пояс
+    # определяется один раз на пачку, а не для каждого товара.
+    if value is None:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+PRODUCT_FIELDS = (
+    "id",
+    "name",
+    "description",
+    "price",
+    "sku",
+    "stock_quantity",
+    "external_id",
+    "updated_at",
+    "supplier_id",
+    "supplier__name",
+    "category_id",
+    "category__name",
+)
+
+
+def _chunks(product_ids):
+    product_ids = sorted(set(product_ids))
+    for start in range(0, len(product_ids), DOCUMENT_BATCH_SIZE):
+        yield product_ids[start : start + DOCUMENT_BATCH_SIZE]
+
+
+def build_product_documents(product_ids):
+    # Два запроса на пачку: товары вместе с поставщиком и категорией
+    # и значения атрибутов с их названиями.
+    attributes = defaultdict(dict)
+    for product_id, name, value in (
+        ProductAttributeValue.objects.filter(product_id__in=product_ids)
+        .order_by("attribute__name")
+        .values_list("product_id", "attribute__name", "value")
+    ):
+        attributes[product_id][name] = value
+
+    tz = timezone.get_current_timezone()
+    documents = {}
+    for row in Product.objects.filter(pk__in=product_ids).values(*PRODUCT_FIELDS):
+        documents[row["id"]] = {
+            "id": row["id"],
+            "name": row["name"],
+            "description": row["description"],
+            "price": str(row["price"]),
+            "sku": row["sku"],
+            "stock_quantity": row["stock_quantity"],
+            "external_id": row["external_id"],
+            "updated_at": format_datetime(row["updated_at"], tz),
+            "supplier": (
+                {"id": row["supplier_id"], "name": row["supplier__name"]}
+                if row["supplier_id"]
+                else None
+            ),
+            "category": (
+                {"id": row["category_id"], "name": row["category__name"]}
+                if row["category_id"]
+                else None
+            ),
+            "attributes": attributes.get(row["id"], {}),
+        }
+    return documents
+
+
+def refresh_product_documents(product_ids):
+    # Документы пересобираются пачками и записываются одним upsert на пачку;
+    # для удалённых товаров строки исчезают сами по CASCADE.
+    refreshed = 0
+    now = timezone.now()
+    for batch in _chunks(product_ids):
+        documents = build_product_documents(batch)
+        if not documents:
+            continue
+        ProductDocument.objects.bulk_create(
+            [
+                ProductDocument(product_id=product_id, data=data, updated_at=now)
+                for product_id, data in documents.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["data", "updated_at"],
+        )
+        refreshed += len(documents)
+    return refreshed
+
+
+def rebuild_product_documents():
+    ProductDocument.objects.all().delete()
+    return refresh_product_documents(Product.objects.values_list("pk", flat=True))
@@ -0,0 +1,80 @@
+import csv
+import json
+from io import StringIO
+from itertools import islice
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ordering_app.api.fastpath import ValuesPlan
+from ordering_app.api.serializers import ProductSerializer
+from ordering_app.models import Product
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def parse_since(value):
+    # ISO 8601; время без часового пояса считается в текущем поясе.
+    since = parse_datetime(value) if value else None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def get_export_plan():
+    # Строки экспорта совпадают с элементами /api/products/.
+    return ValuesPlan.for_serializer(ProductSerializer())
+
+
+def iter_product_chunks(since=None, chunk_size=None):
+    # Товары читаются курсором базы через .iterator() и отдаются пачками
+    # по chunk_size строк, так что в памяти никогда не бывает больше одной
+    # пачки, сколько бы товаров ни было в каталоге.
+    chunk_size = chunk_size or settings.CATALOG_EXPORT_CHUNK_SIZE
+    plan = get_export_plan()
+    queryset = Product.objects.order_by("id")
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    values = plan.values(queryset).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(values, chunk_size)):
+        yield plan.rows(chunk)
+
+
+def iter_ndjson(chunks):
+    for rows in chunks:
+        yield "".join(
+            json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for row in rows
+        )
+
+
+def iter_csv(chunks, fields):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(fields)
+    yield flush()
+    for rows in chunks:
+        writer.writerows(
+            ["" if row[field] is None else row[field] for field in fields]
+            for row in rows
+        )
+        yield flush()
+
+
+def export_products(output_format, since=None, chunk_size=None):
+    chunks = iter_product_chunks(since=since, chunk_size=chunk_size)
+    if output_format == "csv":
+        fields = [name for name, _ in get_export_plan().columns]
+        return iter_csv(chunks, fields)
+    return iter_ndjson(chunks)
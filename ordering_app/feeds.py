@@ -0,0 +1,244 @@
+import time
+from collections import ChainMap
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+import yaml
+from yaml.events import (
+    AliasEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamEndEvent,
+)
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class FeedError(yaml.YAMLError):
+    pass
+
+
+FEED_SUFFIXES = (".yml", ".yaml")
+
+# Разрядность Product.price (max_digits, decimal_places); модуль не
+# импортирует модели, поэтому значения повторены здесь.
+PRICE_MAX_DIGITS = 10
+PRICE_DECIMAL_PLACES = 2
+
+
+def load_feed(stream):
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def collect_feed_files(paths):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(
+                sorted(
+                    child
+                    for child in path.iterdir()
+                    if child.is_file() and child.suffix.lower() in FEED_SUFFIXES
+                )
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def _scalar(value, field):
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"поле '{field}' должно быть строкой или числом")
+    return value
+
+
+def parse_price(value):
+    # Цена, которую нельзя записать в Product.price (NaN, бесконечность,
+    # отрицательная или слишком длинная), отклоняется здесь, а не падает
+    # при записи пачки и не откатывает весь файл.
+    price = Decimal(str(value))
+    if not price.is_finite():
+        raise ValueError("цена должна быть числом")
+    if price < 0:
+        raise ValueError("цена не может быть отрицательной")
+    limit = Decimal(10) ** (PRICE_MAX_DIGITS - PRICE_DECIMAL_PLACES)
+    if price >= limit or price.quantize(Decimal(10) ** -PRICE_DECIMAL_PLACES) >= limit:
+        raise ValueError(f"цена должна быть меньше {limit}")
+    return price
+
+
+def normalize_good(prod_data):
+    # Запись неверной формы (не словарь, параметры не словарём, список
+    # вместо строки) отклоняется ValueError, как и цена, которую нельзя
+    # сохранить: пропускается одна запись, а не весь файл.
+    if not isinstance(prod_data, dict):
+        raise ValueError("запись товара должна быть словарём")
+    raw_parameters = prod_data.get("parameters") or {}
+    if not isinstance(raw_parameters, dict):
+        raise ValueError("поле 'parameters' должно быть словарём")
+    parameters = {}
+    for attr_name, attr_value in raw_parameters.items():
+        if not attr_name or attr_value is None:
+            continue
+        parameters[str(attr_name)] = str(_scalar(attr_value, attr_name))
+
+    external_id = _scalar(prod_data.get("id"), "id")
+    category = _scalar(prod_data.get("category"), "category")
+    quantity = int(_scalar(prod_data.get("quantity") or 0, "quantity"))
+    if quantity < 0:
+        raise ValueError("остаток не может быть отрицательным")
+    return {
+        "id": int(external_id) if external_id is not None else None,
+        "sku": _scalar(prod_data.get("sku"), "sku") or None,
+        "name": _scalar(prod_data["name"], "name"),  # Обязательное поле
+        "description": _scalar(prod_data.get("description"), "description"),
+        "price": parse_price(_scalar(prod_data["price"], "price")),
+        "category": int(category) if category not in (None, "") else None,
+        "quantity": quantity,
+        "parameters": parameters,
+    }
+
+
+def parse_feed_file(path):
+    # Выполняется в дочернем процессе при параллельной загрузке,
+    # поэтому модуль не должен зависеть от Django и базы данных.
+    started = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as file:
+        data = load_feed(file) or {}
+    if not isinstance(data, dict):
+        raise FeedError("Корнем YML файла должен быть словарь.")
+    if not isinstance(data.get("goods") or [], list):
+        raise FeedError("Поле 'goods' должно быть списком.")
+
+    goods = []
+    errors = []
+    for prod_data in data.get("goods") or []:
+        try:
+            goods.append(normalize_good(prod_data))
+        except KeyError as e:
+            errors.append(
+                f"Ошибка в данных товара: отсутствует обязательное поле {e} в записи: {prod_data}"
+            )
+        except (ValueError, InvalidOperation) as e:
+            errors.append(f"Некорректные данные товара ({e}) в записи: {prod_data}")
+
+    return {
+        "path": str(path),
+        "shop": data.get("shop"),
+        "categories": data.get("categories") or [],
+        "goods": goods,
+        "errors": errors,
+        "parse_time": time.perf_counter() - started,
+    }
+
+
+class StreamingFeed:
+    # Читает прайс-лист по событиям YAML: всё, что стоит до "goods",
+    # собирается в header, а сами товары отдаются генератором по одному,
+    # так что в памяти одновременно находится только текущая запись.
+
+    def __init__(self, stream, goods_key="goods"):
+        self.loader = SafeLoader(stream)
+        self.goods_key = goods_key
+        self.header = {}
+        self.anchors = {}
+        self._goods_pending = self._read_header()
+
+    @property
+    def empty(self):
+        return not self.header and not self._goods_pending
+
+    def goods(self):
+        if not self._goods_pending:
+            return
+        self._goods_pending = False
+        # Якоря из заголовка видны всем товарам, а якоря, объявленные внутри
+        # товара, живут только до следующего: иначе словарь якорей рос бы
+        # вместе с файлом. Ссылка на якорь из другого товара — FeedError.
+        header_anchors = self.anchors
+        try:
+            self.loader.get_event()
+            while not self.loader.check_event(SequenceEndEvent):
+                self.anchors = ChainMap({}, header_anchors)
+                yield self._construct(self._compose())
+            self.anchors = header_anchors
+            self.loader.get_event()
+            self._read_mapping_items()
+        finally:
+            self.loader.dispose()
+
+    def _read_header(self):
+        loader = self.loader
+        loader.get_event()
+        if loader.check_event(StreamEndEvent):
+            return False
+        if not loader.check_event(DocumentStartEvent):
+            raise FeedError("Ожидалось начало YAML документа.")
+        loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise FeedError("Корнем YML файла должен быть словарь.")
+        loader.get_event()
+        return self._read_mapping_items()
+
+    def _read_mapping_items(self):
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._construct(self._compose())
+            if key == self.goods_key and self.loader.check_event(SequenceStartEvent):
+                return True
+            self.header[key] = self._construct(self._compose())
+        return False
+
+    def _construct(self, node):
+        return self.loader.construct_document(node)
+
+    def _compose(self):
+        loader = self.loader
+        event = loader.get_event()
+        if isinstance(event, AliasEvent):
+            if event.anchor not in self.anchors:
+                raise FeedError(f"Неизвестный якорь '{event.anchor}'.")
+            return self.anchors[event.anchor]
+
+        if isinstance(event, ScalarEvent):
+            tag = event.tag
+            if tag is None or tag == "!":
+                tag = loader.resolve(ScalarNode, event.value, event.implicit)
+            node = ScalarNode(
+                tag, event.value, event.start_mark, event.end_mark, style=event.style
+            )
+        elif isinstance(event, SequenceStartEvent):
+            tag = event.tag
+            if tag is None or tag == "!":
+                tag = loader.resolve(SequenceNode, None, event.implicit)
+            node = SequenceNode(
+                tag, [], event.start_mark, None, flow_style=event.flow_style
+            )
+            if event.anchor is not None:
+                self.anchors[event.anchor] = node
+            while not loader.check_event(SequenceEndEvent):
+                node.value.append(self._compose())
+            node.end_mark = loader.get_event().end_mark
+        elif isinstance(event, MappingStartEvent):
+            tag = event.tag
+            if tag is None or tag == "!":
+                tag = loader.resolve(MappingNode, None, event.implicit)
+            node = MappingNode(
+                tag, [], event.start_mark, None, flow_style=event.flow_style
+            )
+            if event.anchor is not None:
+                self.anchors[event.anchor] = node
+            while not loader.check_event(MappingEndEvent):
+                key_node = self._compose()
+                node.value.append((key_node, self._compose()))
+            node.end_mark = loader.get_event().end_mark
+        else:
+            raise FeedError(f"Неожиданное событие YAML: {event}")
+
+        if event.anchor is not None:
+            self.anchors[event.anchor] = node
+        return node
@@ -0,0 +1,133 @@
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+
+from ordering_app.carts import (
+    MAX_ITEM_QUANTITY,
+    CartQuantityError,
+    apply_cart_operations,
+)
+from ordering_app.models import Cart, CartItem, Product
+
+GUEST_CART_HEADER = "HTTP_X_CART_TOKEN"
+TOKEN_SALT = "ordering_app.guest_cart"
+
+
+def get_cache():
+    return caches[settings.GUEST_CART_CACHE_ALIAS]
+
+
+def issue_token():
+    return signing.dumps(uuid.uuid4().hex, salt=TOKEN_SALT)
+
+
+def cart_key(token):
+    # Подпись не даёт подобрать или подделать чужой токен; срок жизни
+    # корзины задаёт TTL записи в кэше, он продлевается при каждом
+    # изменении.
+    if not token:
+        return None
+    try:
+        return f"guest-cart:{signing.loads(token, salt=TOKEN_SALT)}"
+    except signing.BadSignature:
+        return None
+
+
+def get_request_token(request):
+    return request.data.get("cart_token") or request.META.get(GUEST_CART_HEADER)
+
+
+def load_items(token):
+    # {product_id: quantity}
+    key = cart_key(token)
+    if key is None:
+        return {}
+    return get_cache().get(key) or {}
+
+
+def save_items(token, items):
+    key = cart_key(token)
+    if not items:
+        get_cache().delete(key)
+    else:
+        get_cache().set(key, items, settings.GUEST_CART_TTL)
+
+
+def apply_guest_operations(items, operations):
+    # Те же операции, что у /api/cart/items/batch/, но над словарём в кэше.
+    items = dict(items)
+    for product_id, quantity, delta in operations:
+        if quantity is None:
+            quantity = items.get(product_id, 0) + delta
+        if quantity > MAX_ITEM_QUANTITY:
+            raise CartQuantityError(
+                f"Количество товара {product_id} не может превышать "
+                f"{MAX_ITEM_QUANTITY}."
+            )
+        if quantity > 0:
+            items[product_id] = quantity
+        else:
+            items.pop(product_id, None)
+    return items
+
+
+def pop_items(token):
+    key = cart_key(token)
+    if key is None:
+        return {}
+    cache = get_cache()
+    items = cache.get(key)
+    cache.delete(key)
+    return items if isinstance(items, dict) else {}
+
+
+def merge_guest_cart(token, user):
+    # Гостевая корзина переносится в корзину пользователя одной пачкой:
+    # количества складываются с уже лежащими там товарами, товары,
+    # исчезнувшие из каталога, пропускаются. Запись забирается из кэша до
+    # переноса, так что повторный вход с тем же токеном ничего не удвоит,
+    # а ошибка переноса не помешает войти: вход важнее гостевой корзины.
+    items = {
+        product_id: quantity
+        for product_id, quantity in pop_items(token).items()
+        if isinstance(product_id, int) and isinstance(quantity, int) and quantity > 0
+    }
+    existing = set(
+        Product.objects.filter(pk__in=list(items)).values_list("pk", flat=True)
+    )
+    items = {
+        product_id: quantity
+        for product_id, quantity in items.items()
+        if product_id in existing
+    }
+    if not items:
+        return 0
+    try:
+        with transaction.atomic():
+            cart, created = Cart.objects.get_or_create(user=user)
+            current = dict(
+                CartItem.objects.filter(cart=cart, product_id__in=items).values_list(
+                    "product_id", "quantity"
+                )
+            )
+            # Сумма с уже лежащим в корзине ограничивается сверху, как у
+            # PositiveIntegerField.
+            apply_cart_operations(
+                cart,
+                [
+                    (
+                        product_id,
+                        min(current.get(product_id, 0) + quantity, MAX_ITEM_QUANTITY),
+                        None,
+                    )
+                    for product_id, quantity in items.items()
+                ],
+            )
+    except CartQuantityError:
+        # Сумма корзины не помещается в Cart.subtotal — корзина
+        # пользователя остаётся как была.
+        return 0
+    return len(items)
@@ -0,0 +1,398 @@
+import hashlib
+import json
+from decimal import InvalidOperation
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from ordering_app.feeds import normalize_good
+from ordering_app.models import (
+    Category,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    REMOVED_IMPORT_HASH,
+    parse_numeric_value,
+)
+from ordering_app.carts import refresh_carts_for_products
+from ordering_app.documents import refresh_product_documents
+from ordering_app.search import index_products
+
+PRODUCT_UPDATE_FIELDS = [
+    "name",
+    "description",
+    "price",
+    "supplier",
+    "category",
+    "stock_quantity",
+    "external_id",
+    "import_hash",
+    "updated_at",
+]
+HASHED_FIELDS = [
+    "id",
+    "sku",
+    "name",
+    "description",
+    "price",
+    "category_id",
+    "quantity",
+    "parameters",
+]
+
+
+def content_hash(row):
+    payload = json.dumps(
+        [row[field] for field in HASHED_FIELDS],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkImporter:
+    def __init__(
+        self,
+        supplier,
+        batch_size=1000,
+        full=False,
+        stdout=None,
+        stderr=None,
+        style=None,
+    ):
+        self.supplier = supplier
+        self.batch_size = batch_size
+        self.full = full
+        self.stdout = stdout
+        self.stderr = stderr
+        self.style = style
+
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.skipped = 0
+
+        self.categories = {}
+        self.attributes = {}
+        self.products_by_external_id = {}
+        self.products_by_sku = {}
+        self.products_by_name = {}
+        self.missing_ids = set()
+        self.has_unkeyed_products = False
+
+    def preload(self):
+        self.categories = dict(Category.objects.values_list("external_id", "id"))
+        self.attributes = dict(ProductAttribute.objects.values_list("name", "id"))
+
+        supplier_products = Product.objects.filter(supplier=self.supplier)
+        # Ранее импортированные товары поставщика, которых не окажется
+        # в текущем файле, будут помечены как удалённые. Импортированным
+        # считается товар с внешним ID или хэшем импорта: хэш сбрасывается
+        # при любой правке товара в обход пакетного импорта.
+        self.missing_ids = set(
+            supplier_products.exclude(import_hash=REMOVED_IMPORT_HASH)
+            .filter(Q(external_id__isnull=False) | ~Q(import_hash=""))
+            .values_list("id", flat=True)
+        )
+        # Поиск по названию нужен только для товаров, загруженных до появления
+        # внешнего ID, и для записей без ID и SKU.
+        self.has_unkeyed_products = supplier_products.filter(
+            external_id__isnull=True
+        ).exists()
+
+    def import_categories(self, categories_data):
+        new_categories = []
+        for cat_data in categories_data:
+            try:
+                external_id = cat_data["id"]
+                name = cat_data["name"]
+            except KeyError as e:
+                self._error(
+                    f"Ошибка в данных категории: отсутствует поле {e} в записи: {cat_data}"
+                )
+                continue
+            if external_id in self.categories:
+                continue
+            self.categories[external_id] = None
+            new_categories.append(Category(external_id=external_id, name=name))
+
+        if new_categories:
+            Category.objects.bulk_create(
+                new_categories, batch_size=self.batch_size, ignore_conflicts=True
+            )
+            self.categories.update(
+                Category.objects.filter(
+                    external_id__in=[
+                        category.external_id for category in new_categories
+                    ]
+                ).values_list("external_id", "id")
+            )
+        return len(new_categories)
+
+    def import_goods(self, goods):
+        for batch in batched(goods, self.batch_size):
+            self._import_batch(batch)
+            self._write(f"Обработано товаров: {self.rows}")
+
+    def _import_batch(self, batch):
+        rows = []
+        for prod_data in batch:
+            self.rows += 1
+            row = self._prepare(prod_data)
+            if row is None:
+                self.skipped += 1
+                continue
+            rows.append(row)
+
+        self._create_missing_attributes(rows)
+        self._fetch_products(rows)
+
+        now = timezone.now()
+        to_create = []
+        to_update = {}
+        batch_products = []
+        for row in rows:
+            row_hash = content_hash(row)
+            product = self._find(row)
+            if product is not None:
+                self.missing_ids.discard(product.pk)
+                if (
+                    not self.full
+                    and product.import_hash == row_hash
+                    and product.supplier_id == self.supplier.pk
+                ):
+                    self.unchanged += 1
+                    continue
+
+            if product is None:
+                product = Product(supplier=self.supplier, sku=row["sku"])
+                to_create.append(product)
+            elif product.pk is not None:
+                to_update[product.pk] = product
+
+            product.name = row["name"]
+            product.description = row["description"]
+            product.price = row["price"]
+            product.supplier = self.supplier
+            product.category_id = row["category_id"]
+            product.stock_quantity = row["quantity"]
+            product.external_id = row["id"]
+            product.import_hash = row_hash
+            product.updated_at = now
+            self._remember(product)
+            batch_products.append((product, row["parameters"]))
+
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            Product.objects.bulk_update(
+                to_update.values(), PRODUCT_UPDATE_FIELDS, batch_size=self.batch_size
+            )
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+        self._write_attribute_values(batch_products)
+        changed_ids = {product.pk for product, _ in batch_products}
+        index_products(changed_ids)
+        refresh_product_documents(changed_ids)
+        if to_update:
+            refresh_carts_for_products(to_update.keys())
+
+    def remove_missing(self):
+        # Товары не удаляются физически: на них могут ссылаться корзины
+        # и заказы, поэтому остаток обнуляется, а вместо хэша ставится
+        # отметка REMOVED_IMPORT_HASH.
+        for ids in batched(sorted(self.missing_ids), self.batch_size):
+            self.removed += Product.objects.filter(pk__in=ids).update(
+                stock_quantity=0,
+                import_hash=REMOVED_IMPORT_HASH,
+                updated_at=timezone.now(),
+            )
+            refresh_product_documents(ids)
+        self.missing_ids.clear()
+        return self.removed
+
+    def _prepare(self, prod_data):
+        try:
+            row = normalize_good(prod_data)
+        except KeyError as e:
+            self._error(
+                f"Ошибка в данных товара: отсутствует обязательное поле {e} в записи: {prod_data}"
+            )
+            return None
+        except (ValueError, InvalidOperation) as e:
+            self._error(f"Некорректные данные товара ({e}) в записи: {prod_data}")
+            return None
+
+        row["category_id"] = None
+        if row["category"]:
+            row["category_id"] = self.categories.get(row["category"])
+            if row["category_id"] is None:
+                self._warning(
+                    f"Категория с ID {row['category']} для товара '{row['name']}' не найдена. "
+                    f"Товар будет создан без категории."
+                )
+        return row
+
+    def _fetch_products(self, rows):
+        self.products_by_external_id = {}
+        self.products_by_sku = {}
+        self.products_by_name = {}
+        fields = ("id", "sku", *PRODUCT_UPDATE_FIELDS)
+
+        external_ids = {row["id"] for row in rows if row["id"] is not None}
+        if external_ids:
+            self._remember_all(
+                Product.objects.filter(
+                    supplier=self.supplier, external_id__in=external_ids
+                ).only(*fields)
+            )
+
+        unmatched = [
+            row for row in rows if row["id"] not in self.products_by_external_id
+        ]
+        # SKU ищется только среди товаров этого поставщика: иначе
+        # поставщики с общим SKU забирали бы товар друг у друга при
+        # каждой загрузке.
+        skus = {row["sku"] for row in unmatched if row["sku"]}
+        if skus:
+            self._remember_all(
+                Product.objects.filter(supplier=self.supplier, sku__in=skus).only(
+                    *fields
+                )
+            )
+
+        names = {
+            row["name"]
+            for row in unmatched
+            if not row["sku"] and (row["id"] is None or self.has_unkeyed_products)
+        }
+        if names:
+            self._remember_all(
+                Product.objects.filter(supplier=self.supplier, name__in=names).only(
+                    *fields
+                )
+            )
+
+    def _find(self, row):
+        if row["id"] is not None:
+            product = self.products_by_external_id.get(row["id"])
+            if product is not None:
+                return product
+        if row["sku"]:
+            return self.products_by_sku.get(row["sku"])
+        product = self.products_by_name.get((row["name"], row["category_id"]))
+        if product is not None and product.external_id not in (None, row["id"]):
+            return None
+        return product
+
+    def _remember_all(self, products):
+        for product in products:
+            self._remember(product)
+
+    def _remember(self, product):
+        if product.sku:
+            self.products_by_sku[product.sku] = product
+        if product.supplier_id == self.supplier.pk:
+            if product.external_id is not None:
+                self.products_by_external_id[product.external_id] = product
+            self.products_by_name.setdefault(
+                (product.name, product.category_id), product
+            )
+
+    def _create_missing_attributes(self, rows):
+        missing = {
+            name
+            for row in rows
+            for name in row["parameters"]
+            if name not in self.attributes
+        }
+        if not missing:
+            return
+        ProductAttribute.objects.bulk_create(
+            [ProductAttribute(name=name) for name in missing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        self.attributes.update(
+            ProductAttribute.objects.filter(name__in=missing).values_list("name", "id")
+        )
+        for name in sorted(missing):
+            self._success(f"Создан новый атрибут товара: '{name}'")
+
+    def _write_attribute_values(self, batch_products):
+        # Товар мог встретиться в файле повторно: актуальны последние параметры.
+        parameters_by_product = {
+            product.pk: parameters for product, parameters in batch_products
+        }
+        wanted = {
+            (product_id, self.attributes[attr_name]): value
+            for product_id, parameters in parameters_by_product.items()
+            for attr_name, value in parameters.items()
+        }
+
+        product_ids = list(parameters_by_product)
+        to_update = []
+        to_delete = []
+        existing = ProductAttributeValue.objects.filter(
+            product_id__in=product_ids
+        ).only("id", "product_id", "attribute_id", "value")
+        for attr_value in existing:
+            key = (attr_value.product_id, attr_value.attribute_id)
+            if key not in wanted:
+                to_delete.append(attr_value.pk)
+                continue
+            value = wanted.pop(key)
+            if attr_value.value != value:
+                attr_value.value = value
+                attr_value.numeric_value = parse_numeric_value(value)
+                to_update.append(attr_value)
+
+        if to_delete:
+            ProductAttributeValue.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            ProductAttributeValue.objects.bulk_update(
+                to_update, ["value", "numeric_value"], batch_size=self.batch_size
+            )
+        if wanted:
+            ProductAttributeValue.objects.bulk_create(
+                [
+                    ProductAttributeValue(
+                        product_id=product_id,
+                        attribute_id=attribute_id,
+                        value=value,
+                        numeric_value=parse_numeric_value(value),
+                    )
+                    for (product_id, attribute_id), value in wanted.items()
+                ],
+                batch_size=self.batch_size,
+            )
+
+    def _write(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def _success(self, message):
+        if self.stdout:
+            self.stdout.write(self.style.SUCCESS(message) if self.style else message)
+
+    def _warning(self, message):
+        if self.stderr:
+            self.stderr.write(self.style.WARNING(message) if self.style else message)
+
+    def _error(self, message):
+        if self.stderr:
+            self.stderr.write(self.style.ERROR(message) if self.style else message)
@@ -0,0 +1,164 @@
+import json
+import multiprocessing
+import sys
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from ordering_app.feeds import StreamingFeed, collect_feed_files
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MODES = {
+    "regular": [],
+    "bulk": ["--bulk"],
+    "stream": ["--stream"],
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class Command(BaseCommand):
+    help = "Замеряет скорость загрузки YML файлов командой load_data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "yaml_file", type=str, nargs="+", help="YML файлы или каталоги с ними"
+        )
+        parser.add_argument(
+            "--mode",
+            choices=list(MODES),
+            action="append",
+            help="Режим load_data; можно указать несколько раз (по умолчанию все)",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=1, help="Количество прогонов каждого режима"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Сохранить загруженные данные (по умолчанию каждый прогон "
+            "откатывается)",
+        )
+        parser.add_argument(
+            "--output", type=str, help="Дописать результаты в файл в формате JSONL"
+        )
+
+    def handle(self, *args, **options):
+        paths = [str(path) for path in collect_feed_files(options["yaml_file"])]
+        if not paths:
+            raise CommandError("Не найдено ни одного YML файла.")
+        if options["repeat"] <= 0:
+            raise CommandError("--repeat должно быть положительным числом.")
+
+        rows = 0
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as file:
+                rows += sum(1 for _ in StreamingFeed(file).goods())
+        self.stdout.write(f"Файлов: {len(paths)}, товаров: {rows}.")
+
+        results = []
+        for mode in options["mode"] or list(MODES):
+            for run in range(1, options["repeat"] + 1):
+                result = self._run_isolated(paths, mode, options)
+                result.update({"mode": mode, "run": run, "files": len(paths)})
+                result["rows"] = rows
+                result["rows_per_sec"] = round(rows / result["wall_time"], 1)
+                results.append(result)
+                rss = result["peak_rss_mb"]
+                self.stdout.write(
+                    f"{mode:<8} #{run}: {result['wall_time']:.2f} с, "
+                    f"{result['rows_per_sec']:.0f} строк/с, "
+                    f"запросов: {result['queries']}, "
+                    f"пиковый RSS: {'-' if rss is None else f'{rss:.1f} МБ'}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "a", encoding="utf-8") as file:
+                for result in results:
+                    file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    def _run_isolated(self, paths, mode, options):
+        # ru_maxrss — пик за всю жизнь процесса, поэтому каждый прогон
+        # выполняется в отдельном дочернем процессе: его пиковый RSS не
+        # включает память предыдущих режимов. Без fork (Windows) прогоны
+        # идут в текущем процессе.
+        if "fork" not in multiprocessing.get_all_start_methods():
+            return self._run(paths, mode, options)
+
+        context = multiprocessing.get_context("fork")
+        # Дочерний процесс открывает собственное соединение с базой.
+        connections.close_all()
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=self._run_child, args=(sender, paths, mode, options)
+        )
+        process.start()
+        sender.close()
+        try:
+            status, payload = receiver.recv()
+        except EOFError:
+            status, payload = "error", f"код завершения {process.exitcode}"
+        process.join()
+        if status == "error":
+            raise CommandError(f"Прогон {mode} завершился ошибкой: {payload}")
+        return payload
+
+    def _run_child(self, sender, paths, mode, options):
+        try:
+            sender.send(("ok", self._run(paths, mode, options)))
+        except Exception as e:
+            sender.send(("error", repr(e)))
+        finally:
+            connections.close_all()
+            sender.close()
+
+    def _run(self, paths, mode, options):
+        args = [
+            *paths,
+            *MODES[mode],
+            "--batch-size",
+            str(options["batch_size"]),
+        ]
+        if len(paths) > 1 and mode != "stream":
+            args += ["--workers", str(options["workers"])]
+
+        counter = QueryCounter()
+        started = time.perf_counter()
+        # Загрузка пишет в базу и без --keep откатывается, поэтому держит
+        # блокировку записи до конца прогона при любом transaction_mode:
+        # замеры стоит запускать на копии базы, а не рядом с живыми воркерами.
+        with transaction.atomic(), connection.execute_wrapper(counter):
+            call_command("load_data", *args, stdout=StringIO(), stderr=StringIO())
+            wall_time = time.perf_counter() - started
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        return {
+            "wall_time": round(wall_time, 4),
+            "queries": counter.count,
+            "peak_rss_mb": peak_rss_mb(),
+        }
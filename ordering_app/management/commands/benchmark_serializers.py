@@ -0,0 +1,106 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from ordering_app.api.fastpath import ValuesPlan
+from ordering_app.api.serializers import (
+    CategorySerializer,
+    OrderSerializer,
+    ProductSerializer,
+    SupplierSerializer,
+)
+from ordering_app.models import Category, Order, Product, Supplier
+
+ENDPOINTS = {
+    "products": (lambda: Product.objects.order_by("id"), ProductSerializer),
+    "categories": (lambda: Category.objects.order_by("id"), CategorySerializer),
+    "suppliers": (lambda: Supplier.objects.order_by("id"), SupplierSerializer),
+    "orders": (
+        lambda: Order.objects.select_related("user", "customer").prefetch_related(
+            Prefetch("items")
+        ),
+        OrderSerializer,
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает стоимость строки списка API: ModelSerializer по экземплярам "
+        "моделей против сборки ответа из .values()"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--endpoint",
+            choices=list(ENDPOINTS),
+            action="append",
+            help="Какие списки замерять; можно указать несколько раз (по умолчанию все)",
+        )
+        parser.add_argument(
+            "--rows", type=int, default=500, help="Строк в одном прогоне"
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Количество прогонов; берётся лучший результат",
+        )
+        parser.add_argument(
+            "--output", type=str, help="Дописать результаты в файл в формате JSONL"
+        )
+
+    def handle(self, *args, **options):
+        if options["rows"] <= 0 or options["repeat"] <= 0:
+            raise CommandError("--rows и --repeat должны быть положительными.")
+
+        results = []
+        for name in options["endpoint"] or list(ENDPOINTS):
+            make_queryset, serializer_class = ENDPOINTS[name]
+            plan = ValuesPlan.for_serializer(serializer_class())
+            if plan is None:
+                raise CommandError(f"{name}: сериализатор не поддерживает .values().")
+
+            queryset = make_queryset()[: options["rows"]]
+            rows = queryset.count()
+            if not rows:
+                self.stdout.write(f"{name:<11} нет данных, пропущено.")
+                continue
+
+            regular = self._best(
+                lambda: serializer_class(queryset.all(), many=True).data,
+                options["repeat"],
+            )
+            fast = self._best(
+                lambda: plan.rows(plan.values(queryset.all())), options["repeat"]
+            )
+            result = {
+                "endpoint": name,
+                "rows": rows,
+                "serializer_us_per_row": round(regular / rows * 1e6, 2),
+                "values_us_per_row": round(fast / rows * 1e6, 2),
+                "speedup": round(regular / fast, 2),
+            }
+            results.append(result)
+            self.stdout.write(
+                f"{name:<11} строк: {rows}, "
+                f"ModelSerializer: {result['serializer_us_per_row']:.1f} мкс/строка, "
+                f".values(): {result['values_us_per_row']:.1f} мкс/строка, "
+                f"ускорение ×{result['speedup']:.1f}"
+            )
+
+        if options["output"]:
+            with open(options["output"], "a", encoding="utf-8") as file:
+                for result in results:
+                    file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    def _best(self, build, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            build()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ordering_app.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает снимок каталога (товары, категории, поставщики, атрибуты) "
+        "для чтения API из памяти"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            type=str,
+            help="Файл снимка (по умолчанию CATALOG_SNAPSHOT_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.CATALOG_SNAPSHOT_PATH
+        if not path:
+            raise CommandError("Укажите --path или настройку CATALOG_SNAPSHOT_PATH.")
+
+        started = time.perf_counter()
+        counts = build_snapshot(path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Снимок {path} собран за {time.perf_counter() - started:.2f} с: "
+                f"товаров {counts['products']}, категорий {counts['categories']}, "
+                f"поставщиков {counts['suppliers']}."
+            )
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ordering_app.export import EXPORT_FORMATS, export_products, parse_since
+
+
+class Command(BaseCommand):
+    help = "Выгружает каталог товаров потоком в NDJSON или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=list(EXPORT_FORMATS), default="ndjson", dest="format"
+        )
+        parser.add_argument(
+            "--since",
+            type=str,
+            help="Только товары, изменённые с этого момента (ISO 8601)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument(
+            "-o", "--output", type=str, help="Файл для выгрузки (по умолчанию stdout)"
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = parse_since(options["since"])
+            except ValueError:
+                since = None
+            if since is None:
+                raise CommandError(
+                    "--since: ожидается дата и время в формате ISO 8601."
+                )
+        if options["chunk_size"] is not None and options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size должно быть положительным числом.")
+
+        started_at = timezone.now()
+        chunks = export_products(
+            options["format"], since=since, chunk_size=options["chunk_size"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+            self.stderr.write(
+                f"Выгрузка завершена. Для следующей: --since {started_at.isoformat()}"
+            )
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,130 @@
+import random
+
+import yaml
+from django.core.management.base import BaseCommand, CommandError
+
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+BRANDS = [
+    "Apple",
+    "Samsung",
+    "Xiaomi",
+    "Sony",
+    "LG",
+    "Huawei",
+    "Lenovo",
+    "Kingston",
+    "SanDisk",
+    "TCL",
+]
+COLORS = ["черный", "белый", "золотистый", "красный", "синий", "серебристый"]
+CATEGORY_NAMES = [
+    "Смартфоны",
+    "Аксессуары",
+    "Flash-накопители",
+    "Телевизоры",
+    "Ноутбуки",
+    "Планшеты",
+    "Наушники",
+    "Мониторы",
+]
+ATTRIBUTES = [
+    ("Диагональ (дюйм)", lambda rnd: round(rnd.uniform(4.0, 75.0), 1)),
+    (
+        "Разрешение (пикс)",
+        lambda rnd: rnd.choice(["1920x1080", "2688x1242", "3840x2160"]),
+    ),
+    ("Встроенная память (Гб)", lambda rnd: rnd.choice([32, 64, 128, 256, 512])),
+    ("Цвет", lambda rnd: rnd.choice(COLORS)),
+    ("Smart TV", lambda rnd: rnd.choice([True, False])),
+    ("Вес (г)", lambda rnd: rnd.randint(20, 25000)),
+]
+
+
+class Command(BaseCommand):
+    help = "Генерирует YML файл поставщика с синтетическим каталогом товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", type=str, help="Путь к создаваемому YML файлу")
+        parser.add_argument(
+            "--goods", type=int, default=1000, help="Количество товаров"
+        )
+        parser.add_argument(
+            "--categories", type=int, default=10, help="Количество категорий"
+        )
+        parser.add_argument(
+            "--attributes", type=int, default=6, help="Количество атрибутов товаров"
+        )
+        parser.add_argument(
+            "--shop", type=str, default="Тестовый магазин", help="Название магазина"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Начальное значение генератора"
+        )
+
+    def handle(self, *args, **options):
+        for name in ("goods", "categories", "attributes"):
+            if options[name] <= 0:
+                raise CommandError(f"--{name} должно быть положительным числом.")
+
+        rnd = random.Random(options["seed"])
+        categories = [
+            {
+                "id": index + 1,
+                "name": f"{CATEGORY_NAMES[index % len(CATEGORY_NAMES)]} {index + 1}",
+            }
+            for index in range(options["categories"])
+        ]
+        attributes = []
+        for index in range(options["attributes"]):
+            name, make_value = ATTRIBUTES[index % len(ATTRIBUTES)]
+            if index >= len(ATTRIBUTES):
+                name = f"{name} {index // len(ATTRIBUTES) + 1}"
+            attributes.append((name, make_value))
+
+        with open(options["output"], "w", encoding="utf-8") as file:
+            self._dump({"shop": options["shop"]}, file)
+            file.write("\n")
+            self._dump({"categories": categories}, file)
+            file.write("\ngoods:\n")
+            for index in range(options["goods"]):
+                self._dump([self._good(rnd, index, categories, attributes)], file)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создан файл {options['output']}: товаров {options['goods']}, "
+                f"категорий {len(categories)}, атрибутов {len(attributes)}."
+            )
+        )
+
+    def _good(self, rnd, index, categories, attributes):
+        brand = rnd.choice(BRANDS)
+        memory = rnd.choice([32, 64, 128, 256, 512])
+        color = rnd.choice(COLORS)
+        price = rnd.randint(5, 2000) * 100
+        parameters = {
+            name: make_value(rnd)
+            for name, make_value in rnd.sample(
+                attributes, k=rnd.randint(1, min(len(attributes), 6))
+            )
+        }
+        return {
+            "id": 1000000 + index,
+            "category": rnd.choice(categories)["id"],
+            "model": f"{brand.lower()}/model-{index}",
+            "name": f"{brand} Model {index} {memory}GB ({color})",
+            "price": price,
+            "price_rrc": price + rnd.randint(0, 50) * 100,
+            "quantity": rnd.randint(0, 50),
+            "parameters": parameters,
+        }
+
+    def _dump(self, data, file):
+        yaml.dump(
+            data,
+            file,
+            Dumper=SafeDumper,
+            allow_unicode=True,
+            sort_keys=False,
+            default_flow_style=False,
+        )
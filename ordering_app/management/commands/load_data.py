@@ -1,7 +1,20 @@
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import yaml
 from django.core.management.base import BaseCommand, CommandError
 from django.db import IntegrityError, transaction
 from django.apps import apps
+from django.conf import settings
+from ordering_app.catalog import bump_catalog_version, get_catalog_version
+from ordering_app.feeds import (
+    StreamingFeed,
+    collect_feed_files,
+    load_feed,
+    parse_feed_file,
+)
+from ordering_app.importer import BulkImporter
 from ordering_app.models import (
     Supplier,
     Category,
@@ -9,21 +22,96 @@ from ordering_app.models import (
     ProductAttribute,
     ProductAttributeValue,
 )
+from ordering_app.signals import collect_catalog_changes
+from ordering_app.snapshot import build_snapshot
 
 
 class Command(BaseCommand):
     help = "Загружает данные из YML файла в базу данных"
 
     def add_arguments(self, parser):
-        parser.add_argument("yaml_file", type=str, help="Путь к YML файлу с данными")
+        parser.add_argument(
+            "yaml_file",
+            type=str,
+            nargs="+",
+            help="Пути к YML файлам или каталогам с YML файлами",
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Пакетный режим: запись товаров через bulk_create/bulk_update",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Потоковое чтение товаров из YML без загрузки файла целиком "
+            "(использует пакетный режим)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Размер пачки товаров в пакетном режиме (по умолчанию 1000)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пакетный режим: перезаписать все товары, даже если их данные "
+            "не изменились с прошлого импорта",
+        )
+        parser.add_argument(
+            "--keep-missing",
+            action="store_true",
+            help="Пакетный режим: не обнулять остаток товаров поставщика, "
+            "отсутствующих в файле",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Число процессов для разбора файлов при загрузке нескольких "
+            "файлов (по умолчанию 1)",
+        )
 
     def handle(self, *args, **options):
-        yaml_file_path = options["yaml_file"]
+        # Снимок каталога пересобирается, если загрузка что-то изменила,
+        # в том числе при частично неудачной загрузке нескольких файлов.
+        snapshot_path = settings.CATALOG_SNAPSHOT_PATH
+        version = get_catalog_version() if snapshot_path else None
+        try:
+            self._load(**options)
+        finally:
+            if snapshot_path and get_catalog_version() != version:
+                counts = build_snapshot(snapshot_path)
+                self.stdout.write(
+                    f"Снимок каталога {snapshot_path} обновлён: "
+                    f"товаров {counts['products']}."
+                )
+
+    def _load(self, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("Размер пачки должен быть положительным числом.")
+        if options["workers"] <= 0:
+            raise CommandError("Число процессов должно быть положительным числом.")
+
+        paths = collect_feed_files(options["yaml_file"])
+        if not paths:
+            raise CommandError("Не найдено ни одного YML файла для загрузки.")
+        if len(paths) > 1:
+            self._import_many(paths, options)
+            return
+
+        yaml_file_path = str(paths[0])
         self.stdout.write(f"Начинаю загрузку данных из файла: {yaml_file_path}")
 
+        if options["stream"]:
+            self._stream_import(yaml_file_path, options)
+            self.stdout.write(self.style.SUCCESS("Загрузка данных успешно завершена."))
+            return
+
         try:
             with open(yaml_file_path, "r", encoding="utf-8") as file:
-                data = yaml.safe_load(file)
+                data = load_feed(file)
         except FileNotFoundError:
             raise CommandError(f'Файл "{yaml_file_path}" не найден.')
         except yaml.YAMLError as e:
@@ -34,14 +122,145 @@ class Command(BaseCommand):
                 self.style.WARNING("YML файл пуст или не содержит данных.")
             )
             return
+        if not isinstance(data, dict):
+            raise CommandError(
+                f'Ошибка в YML файле "{yaml_file_path}": корнем должен быть словарь.'
+            )
 
-        with transaction.atomic():
-            self._process_supplier(data)
-            self._process_categories(data)
-            self._process_products(data)
+        if options["bulk"]:
+            with transaction.atomic():
+                self._process_supplier(data)
+                self._bulk_import(data, data.get("goods", []), options)
+        else:
+            # Сигналы сохранения копят изменённые товары, и индекс, документы
+            # и версия каталога обновляются один раз на файл в его транзакции.
+            with transaction.atomic(), collect_catalog_changes():
+                self._process_supplier(data)
+                self._process_categories(data)
+                self._process_products(data)
 
         self.stdout.write(self.style.SUCCESS("Загрузка данных успешно завершена."))
 
+    def _import_many(self, paths, options):
+        workers = options["workers"]
+        if options["stream"] and workers > 1:
+            raise CommandError("Потоковый режим нельзя сочетать с --workers больше 1.")
+
+        self.stdout.write(
+            f"Начинаю загрузку {len(paths)} файлов (процессов для разбора: {workers})."
+        )
+        started = time.perf_counter()
+        totals = Counter()
+        failed = []
+
+        if options["stream"]:
+            results = ((str(path), None) for path in paths)
+        else:
+            results = self._parse_feeds(paths, workers)
+
+        for index, (path, parsed) in enumerate(results, start=1):
+            self.current_supplier = None
+            try:
+                if parsed is None:
+                    importer = self._stream_import(path, options)
+                else:
+                    importer = self._write_parsed_feed(parsed, options)
+            except CommandError as e:
+                failed.append(path)
+                self.stderr.write(
+                    self.style.ERROR(f"[{index}/{len(paths)}] {path}: {e}")
+                )
+                continue
+
+            if importer is None:
+                continue
+            totals["files"] += 1
+            totals["rows"] += importer.rows
+            totals["created"] += importer.created
+            totals["updated"] += importer.updated
+            totals["unchanged"] += importer.unchanged
+            totals["removed"] += importer.removed
+            totals["skipped"] += importer.skipped
+            if parsed is not None:
+                totals["rows"] += len(parsed["errors"])
+                totals["skipped"] += len(parsed["errors"])
+            self.stdout.write(
+                f"[{index}/{len(paths)}] {path}: товаров {importer.rows}, "
+                f"создано {importer.created}, обновлено {importer.updated}, "
+                f"без изменений {importer.unchanged}, удалено {importer.removed}."
+            )
+
+        elapsed = time.perf_counter() - started
+        rate = totals["rows"] / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Итого файлов: {totals['files']} из {len(paths)}, товаров: {totals['rows']} "
+                f"(создано: {totals['created']}, обновлено: {totals['updated']}, "
+                f"без изменений: {totals['unchanged']}, удалено: {totals['removed']}, "
+                f"пропущено: {totals['skipped']}) за {elapsed:.2f} с, {rate:.0f} строк/с."
+            )
+        )
+        if failed:
+            raise CommandError(f"Не удалось загрузить файлы: {', '.join(failed)}")
+
+    def _parse_feeds(self, paths, workers):
+        if workers == 1:
+            for path in paths:
+                yield str(path), self._parse_feed_file(path)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(parse_feed_file, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                # Любая ошибка разбора, в том числе падение дочернего
+                # процесса, относится к своему файлу и не прерывает загрузку
+                # остальных.
+                try:
+                    yield str(path), future.result()
+                except Exception as e:
+                    yield str(path), {"path": str(path), "error": e}
+
+    def _parse_feed_file(self, path):
+        try:
+            return parse_feed_file(path)
+        except Exception as e:
+            return {"path": str(path), "error": e}
+
+    def _write_parsed_feed(self, parsed, options):
+        if "error" in parsed:
+            raise CommandError(f"Ошибка при чтении YML файла: {parsed['error']}")
+        for error in parsed["errors"]:
+            self.stderr.write(self.style.ERROR(error))
+        self.stdout.write(
+            f"Файл {parsed['path']} разобран за {parsed['parse_time']:.2f} с."
+        )
+        with transaction.atomic():
+            self._process_supplier(parsed)
+            return self._bulk_import(parsed, parsed["goods"], options)
+
+    def _stream_import(self, yaml_file_path, options):
+        try:
+            with open(yaml_file_path, "r", encoding="utf-8") as file:
+                feed = StreamingFeed(file)
+                if feed.empty:
+                    self.stdout.write(
+                        self.style.WARNING("YML файл пуст или не содержит данных.")
+                    )
+                    return None
+                if "shop" not in feed.header:
+                    raise CommandError(
+                        "В потоковом режиме поля 'shop' и 'categories' "
+                        "должны располагаться в файле до 'goods'."
+                    )
+                with transaction.atomic():
+                    self._process_supplier(feed.header)
+                    return self._bulk_import(feed.header, feed.goods(), options)
+        except FileNotFoundError:
+            raise CommandError(f'Файл "{yaml_file_path}" не найден.')
+        except yaml.YAMLError as e:
+            raise CommandError(f'Ошибка при парсинге YML файла "{yaml_file_path}": {e}')
+
     def _process_supplier(self, data):
         shop_name = data.get("shop")
         if not shop_name:
@@ -71,6 +290,57 @@ class Command(BaseCommand):
             )
             raise CommandError("Ошибка обработки данных поставщика.")
 
+    def _bulk_import(self, data, goods, options):
+        current_supplier = getattr(self, "current_supplier", None)
+        if not current_supplier:
+            self.stderr.write(
+                self.style.ERROR(
+                    "Поставщик не был определен. Пропуск загрузки товаров."
+                )
+            )
+            return None
+
+        started = time.perf_counter()
+        importer = BulkImporter(
+            current_supplier,
+            batch_size=options["batch_size"],
+            full=options["full"],
+            stdout=self.stdout,
+            stderr=self.stderr,
+            style=self.style,
+        )
+        importer.preload()
+
+        categories_data = data.get("categories", [])
+        self.stdout.write(f"Найдено {len(categories_data)} категорий для загрузки.")
+        created_categories = importer.import_categories(categories_data)
+        self.stdout.write(f"Создано новых категорий: {created_categories}.")
+
+        importer.import_goods(goods)
+        if not options["keep_missing"]:
+            importer.remove_missing()
+        # bulk_create/bulk_update не отправляют сигналы моделей, поэтому
+        # версия каталога обновляется явно.
+        if (
+            created_categories
+            or importer.created
+            or importer.updated
+            or importer.removed
+        ):
+            bump_catalog_version()
+
+        elapsed = time.perf_counter() - started
+        rate = importer.rows / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Товаров обработано: {importer.rows} (создано: {importer.created}, "
+                f"обновлено: {importer.updated}, без изменений: {importer.unchanged}, "
+                f"удалено: {importer.removed}, пропущено: {importer.skipped}) "
+                f"за {elapsed:.2f} с, {rate:.0f} строк/с."
+            )
+        )
+        return importer
+
     def _process_categories(self, data):
         categories_data = data.get("categories", [])
         self.stdout.write(f"Найдено {len(categories_data)} категорий для загрузки.")
@@ -115,6 +385,7 @@ class Command(BaseCommand):
             try:
                 product_sku = prod_data.get("sku")
                 product_name = prod_data["name"]  # Обязательное поле
+                external_id = prod_data.get("id")
 
                 category_id = prod_data.get("category")
                 category = None
@@ -147,16 +418,34 @@ class Command(BaseCommand):
                     product_parameters_list.append((attribute, str(attr_value)))
 
                 product = None
-                if product_sku:
+                if external_id is not None:
+                    product = Product.objects.filter(
+                        supplier=current_supplier, external_id=external_id
+                    ).first()
+
+                if product:
+                    product.name = product_name
+                    product.description = prod_data.get("description")
+                    product.price = prod_data["price"]
+                    product.category = category
+                    product.stock_quantity = prod_data.get("quantity", 0)
+                    if product_sku:
+                        product.sku = product_sku
+                    product.save()
+                    self.stdout.write(
+                        f"Обновлен товар по внешнему ID: '{product.name}' (ID: {external_id})"
+                    )
+                elif product_sku:
                     product, created = Product.objects.get_or_create(
                         sku=product_sku,
+                        supplier=current_supplier,
                         defaults={
                             "name": product_name,
                             "description": prod_data.get("description"),
                             "price": prod_data["price"],
-                            "supplier": current_supplier,
                             "category": category,
                             "stock_quantity": prod_data.get("quantity", 0),
+                            "external_id": external_id,
                         },
                     )
                     if created:
@@ -169,23 +458,29 @@ class Command(BaseCommand):
                         product.name = product_name
                         product.description = prod_data.get("description")
                         product.price = prod_data["price"]
-                        product.supplier = current_supplier
                         product.category = category
                         product.stock_quantity = prod_data.get("quantity", 0)
+                        product.external_id = external_id
                         product.save()
                         self.stdout.write(
                             f"Обновлен товар по SKU: '{product.name}' (SKU: {product.sku})"
                         )
                 else:
-                    existing_product = Product.objects.filter(
+                    existing_products = Product.objects.filter(
                         name=product_name, supplier=current_supplier, category=category
-                    ).first()
+                    )
+                    if external_id is not None:
+                        existing_products = existing_products.filter(
+                            external_id__isnull=True
+                        )
+                    existing_product = existing_products.first()
 
                     if existing_product:
                         product = existing_product
                         product.description = prod_data.get("description")
                         product.price = prod_data["price"]
                         product.stock_quantity = prod_data.get("quantity", 0)
+                        product.external_id = external_id
                         if product.supplier != current_supplier:
                             product.supplier = current_supplier
                         if product.category != category:
@@ -203,6 +498,7 @@ class Command(BaseCommand):
                             category=category,
                             sku=None,
                             stock_quantity=prod_data.get("quantity", 0),
+                            external_id=external_id,
                         )
                         self.stdout.write(
                             self.style.SUCCESS(
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ordering_app.documents import rebuild_product_documents
+
+
+class Command(BaseCommand):
+    help = "Полностью пересобирает документы товаров для чтения через API"
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            rebuilt = rebuild_product_documents()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Собрано документов: {rebuilt} "
+                f"за {time.perf_counter() - started:.2f} с."
+            )
+        )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ordering_app.search import rebuild_search_index, search_supported
+
+
+class Command(BaseCommand):
+    help = "Полностью перестраивает полнотекстовый индекс товаров (SQLite FTS5)"
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            raise CommandError(
+                "Полнотекстовый индекс поддерживается только для SQLite."
+            )
+        started = time.perf_counter()
+        with transaction.atomic():
+            indexed = rebuild_search_index()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Проиндексировано товаров: {indexed} "
+                f"за {time.perf_counter() - started:.2f} с."
+            )
+        )
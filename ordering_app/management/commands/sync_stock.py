@@ -0,0 +1,242 @@
+import csv
+import json
+import time
+from decimal import InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ordering_app.catalog import bump_catalog_version, get_catalog_version
+from ordering_app.carts import MAX_ITEM_QUANTITY, refresh_carts_for_products
+from ordering_app.documents import refresh_product_documents
+from ordering_app.feeds import parse_price
+from ordering_app.importer import batched
+from ordering_app.models import Product, Supplier
+from ordering_app.snapshot import build_snapshot
+
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+
+class Command(BaseCommand):
+    help = "Быстро обновляет цены и остатки товаров из CSV/JSONL файла"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            type=str,
+            help="Путь к CSV или JSONL файлу с колонками sku или external_id, "
+            "price, quantity",
+        )
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=["csv", "jsonl"],
+            help="Формат файла (по умолчанию определяется по расширению)",
+        )
+        parser.add_argument(
+            "--supplier",
+            type=str,
+            help="Название поставщика; обязательно для строк с external_id, "
+            "строки с sku обновляют тогда только его товары",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Количество строк в одном UPDATE (по умолчанию 500)",
+        )
+
+    def handle(self, *args, **options):
+        # Как и load_data, пересобирает снимок каталога, если что-то
+        # обновилось: иначе после ежечасной синхронизации чтение шло бы из
+        # базы до следующей ночной загрузки.
+        snapshot_path = settings.CATALOG_SNAPSHOT_PATH
+        version = get_catalog_version() if snapshot_path else None
+        try:
+            self._sync(**options)
+        finally:
+            if snapshot_path and get_catalog_version() != version:
+                counts = build_snapshot(snapshot_path)
+                self.stdout.write(
+                    f"Снимок каталога {snapshot_path} обновлён: "
+                    f"товаров {counts['products']}."
+                )
+
+    def _sync(self, **options):
+        path = Path(options["path"])
+        file_format = options["file_format"] or FORMATS.get(path.suffix.lower())
+        if file_format is None:
+            raise CommandError(
+                f'Не удалось определить формат файла "{path}", укажите --format.'
+            )
+        if options["batch_size"] <= 0:
+            raise CommandError("Размер пачки должен быть положительным числом.")
+
+        self.supplier = None
+        if options["supplier"]:
+            try:
+                self.supplier = Supplier.objects.get(name=options["supplier"])
+            except Supplier.DoesNotExist:
+                raise CommandError(f"Поставщик '{options['supplier']}' не найден.")
+
+        self.updated = 0
+        self.missing = 0
+        self.errors = 0
+        rows_total = 0
+        started = time.perf_counter()
+
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as file:
+                records = (
+                    csv.DictReader(file)
+                    if file_format == "csv"
+                    else self._read_jsonl(file)
+                )
+                for batch in batched(self._parse(records), options["batch_size"]):
+                    rows_total += len(batch)
+                    with transaction.atomic():
+                        updated = self.updated
+                        self._apply(batch)
+                        if self.updated > updated:
+                            bump_catalog_version()
+        except FileNotFoundError:
+            raise CommandError(f'Файл "{path}" не найден.')
+
+        rows_total += self.errors
+        elapsed = time.perf_counter() - started
+        rate = rows_total / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Строк обработано: {rows_total} (обновлено: {self.updated}, "
+                f"не найдено: {self.missing}, ошибок: {self.errors}) "
+                f"за {elapsed:.2f} с, {rate:.0f} строк/с."
+            )
+        )
+
+    def _read_jsonl(self, file):
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                self.errors += 1
+                self.stderr.write(
+                    self.style.ERROR(f"Строка {line_number}: некорректный JSON: {e}")
+                )
+
+    def _parse(self, records):
+        for record in records:
+            try:
+                yield self._parse_record(record)
+            except (KeyError, ValueError, InvalidOperation) as e:
+                self.errors += 1
+                self.stderr.write(
+                    self.style.ERROR(f"Некорректная запись {record}: {e}")
+                )
+
+    def _parse_record(self, record):
+        external_id = record.get("external_id") or record.get("id")
+        sku = record.get("sku")
+        if external_id not in (None, ""):
+            if self.supplier is None:
+                raise ValueError("для external_id нужно указать --supplier")
+            key = ("external_id", int(external_id))
+        elif sku not in (None, ""):
+            key = ("sku", str(sku))
+        else:
+            raise KeyError("sku или external_id")
+
+        price = record.get("price")
+        quantity = record.get("quantity")
+        # Цена проверяется до UPDATE: значение, не помещающееся в
+        # Product.price, записалось бы и сломало пересборку документов.
+        price = None if price in (None, "") else parse_price(price)
+        quantity = None if quantity in (None, "") else int(quantity)
+        if quantity is not None and quantity < 0:
+            raise ValueError("остаток не может быть отрицательным")
+        if quantity is not None and quantity > MAX_ITEM_QUANTITY:
+            raise ValueError(f"остаток не может превышать {MAX_ITEM_QUANTITY}")
+        return key, price, quantity
+
+    def _apply(self, batch):
+        by_field = {"external_id": {}, "sku": {}}
+        for (field, value), price, quantity in batch:
+            by_field[field][value] = (price, quantity)
+
+        for field, changes in by_field.items():
+            if not changes:
+                continue
+            products = Product.objects.filter(**{f"{field}__in": list(changes)})
+            if self.supplier is not None:
+                products = products.filter(supplier=self.supplier)
+
+            # sku не уникален: одной строке файла может соответствовать
+            # несколько товаров, и все они обновляются одним UPDATE.
+            found = {}
+            for key, pk in products.values_list(field, "pk"):
+                found.setdefault(key, []).append(pk)
+            self.missing += len(changes) - len(found)
+
+            self.updated += self._update(field, changes)
+            refresh_product_documents(pk for pks in found.values() for pk in pks)
+            refresh_carts_for_products(
+                pk
+                for key, (price, _) in changes.items()
+                if price is not None
+                for pk in found.get(key, ())
+            )
+
+    def _update(self, field, changes):
+        # Одним UPDATE с CASE на пачку: построение такого же выражения через
+        # Case/When в ORM на сотнях строк обходится дороже самого запроса.
+        qn = connection.ops.quote_name
+        opts = Product._meta
+        key_column = qn(opts.get_field(field).column)
+
+        assignments = []
+        params = []
+        for position, field_name in enumerate(("price", "stock_quantity")):
+            values = [
+                (key, change[position])
+                for key, change in changes.items()
+                if change[position] is not None
+            ]
+            if not values:
+                continue
+            column = qn(opts.get_field(field_name).column)
+            cases = " ".join(["WHEN %s THEN %s"] * len(values))
+            assignments.append(
+                f"{column} = CASE {key_column} {cases} ELSE {column} END"
+            )
+            for key, value in values:
+                params.extend([key, value])
+        if not assignments:
+            return 0
+        updated_at = qn(opts.get_field("updated_at").column)
+        assignments.append(f"{updated_at} = %s")
+        params.append(connection.ops.adapt_datetimefield_value(timezone.now()))
+        # Цена и остаток больше не совпадают с файлом поставщика: следующий
+        # пакетный импорт должен перезаписать товар.
+        assignments.append(f"{qn(opts.get_field('import_hash').column)} = ''")
+
+        where = f"{key_column} IN ({', '.join(['%s'] * len(changes))})"
+        params.extend(changes)
+        if self.supplier is not None:
+            where += f" AND {qn(opts.get_field('supplier').column)} = %s"
+            params.append(self.supplier.pk)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(opts.db_table)} SET {', '.join(assignments)} WHERE {where}",
+                params,
+            )
+            return cursor.rowcount
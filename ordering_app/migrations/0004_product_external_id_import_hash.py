@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0003_alter_category_options_alter_product_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="external_id",
+            field=models.BigIntegerField(
+                blank=True, null=True, verbose_name="External ID"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="import_hash",
+            field=models.CharField(
+                blank=True, default="", max_length=32, verbose_name="Import Hash"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["supplier", "external_id"], name="product_supplier_external_idx"
+            ),
+        ),
+    ]
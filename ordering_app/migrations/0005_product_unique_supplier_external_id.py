@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0004_product_external_id_import_hash"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_supplier_external_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                fields=("supplier", "external_id"),
+                name="unique_product_supplier_external_id",
+            ),
+        ),
+    ]
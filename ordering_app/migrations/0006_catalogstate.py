@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_catalog_state(apps, schema_editor):
+    CatalogState = apps.get_model("ordering_app", "CatalogState")
+    CatalogState.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0005_product_unique_supplier_external_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "version",
+                    models.PositiveBigIntegerField(default=0, verbose_name="Version"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Last Updated"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Catalog State",
+                "verbose_name_plural": "Catalog State",
+            },
+        ),
+        migrations.RunPython(create_catalog_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0006_catalogstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Last Updated"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Last Updated"),
+        ),
+        migrations.AddField(
+            model_name="supplier",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Last Updated"),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0007_catalog_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "price"], name="product_category_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["price"], name="product_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productattributevalue",
+            index=models.Index(
+                fields=["attribute", "value", "product"], name="attr_value_product_idx"
+            ),
+        ),
+    ]
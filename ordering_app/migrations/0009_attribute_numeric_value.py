@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:03
+
+import math
+
+from django.db import migrations, models
+
+
+def parse_numeric_value(value):
+    try:
+        number = float(str(value).strip().replace(",", "."))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def backfill_numeric_values(apps, schema_editor):
+    ProductAttributeValue = apps.get_model("ordering_app", "ProductAttributeValue")
+    batch = []
+    for attr_value in ProductAttributeValue.objects.only("id", "value").iterator(
+        chunk_size=2000
+    ):
+        attr_value.numeric_value = parse_numeric_value(attr_value.value)
+        if attr_value.numeric_value is not None:
+            batch.append(attr_value)
+        if len(batch) >= 2000:
+            ProductAttributeValue.objects.bulk_update(batch, ["numeric_value"])
+            batch = []
+    if batch:
+        ProductAttributeValue.objects.bulk_update(batch, ["numeric_value"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0008_catalog_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productattributevalue",
+            name="numeric_value",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Numeric Value"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productattributevalue",
+            index=models.Index(
+                fields=["attribute", "numeric_value", "product"],
+                name="attr_numeric_product_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_numeric_values, migrations.RunPython.noop),
+    ]
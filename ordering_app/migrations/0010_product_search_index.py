@@ -0,0 +1,42 @@
+from django.db import migrations
+
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS ordering_app_product_search USING fts5(
+    name, description, supplier, attributes,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+FILL_SEARCH_TABLE = """
+INSERT INTO ordering_app_product_search (rowid, name, description, supplier, attributes)
+SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(s.name, ''),
+       COALESCE((SELECT group_concat(v.value, ' ')
+                 FROM ordering_app_productattributevalue v
+                 WHERE v.product_id = p.id), '')
+FROM ordering_app_product p
+LEFT JOIN ordering_app_supplier s ON s.id = p.supplier_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(FILL_SEARCH_TABLE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS ordering_app_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0009_attribute_numeric_value"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
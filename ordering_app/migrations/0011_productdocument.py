@@ -0,0 +1,101 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:14
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+from rest_framework import serializers
+
+DATETIME_FIELD = serializers.DateTimeField()
+
+
+def build_documents(apps, schema_editor):
+    Product = apps.get_model("ordering_app", "Product")
+    ProductAttributeValue = apps.get_model("ordering_app", "ProductAttributeValue")
+    ProductDocument = apps.get_model("ordering_app", "ProductDocument")
+
+    attributes = defaultdict(dict)
+    for product_id, name, value in ProductAttributeValue.objects.order_by(
+        "attribute__name"
+    ).values_list("product_id", "attribute__name", "value"):
+        attributes[product_id][name] = value
+
+    now = timezone.now()
+    documents = []
+    for row in Product.objects.values(
+        "id",
+        "name",
+        "description",
+        "price",
+        "sku",
+        "stock_quantity",
+        "external_id",
+        "updated_at",
+        "supplier_id",
+        "supplier__name",
+        "category_id",
+        "category__name",
+    ).iterator(chunk_size=2000):
+        data = {
+            "id": row["id"],
+            "name": row["name"],
+            "description": row["description"],
+            "price": str(row["price"]),
+            "sku": row["sku"],
+            "stock_quantity": row["stock_quantity"],
+            "external_id": row["external_id"],
+            "updated_at": DATETIME_FIELD.to_representation(row["updated_at"]),
+            "supplier": (
+                {"id": row["supplier_id"], "name": row["supplier__name"]}
+                if row["supplier_id"]
+                else None
+            ),
+            "category": (
+                {"id": row["category_id"], "name": row["category__name"]}
+                if row["category_id"]
+                else None
+            ),
+            "attributes": attributes.pop(row["id"], {}),
+        }
+        documents.append(
+            ProductDocument(product_id=row["id"], data=data, updated_at=now)
+        )
+        if len(documents) >= 2000:
+            ProductDocument.objects.bulk_create(documents)
+            documents = []
+    if documents:
+        ProductDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0010_product_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="document",
+                        serialize=False,
+                        to="ordering_app.product",
+                        verbose_name="Product",
+                    ),
+                ),
+                ("data", models.JSONField(verbose_name="Data")),
+                ("updated_at", models.DateTimeField(verbose_name="Last Updated")),
+            ],
+            options={
+                "verbose_name": "Product Document",
+                "verbose_name_plural": "Product Documents",
+            },
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:31
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_summaries(apps, schema_editor):
+    Cart = apps.get_model("ordering_app", "Cart")
+    CartItem = apps.get_model("ordering_app", "CartItem")
+    items = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+    count_field = models.PositiveIntegerField()
+    subtotal_field = models.DecimalField(max_digits=12, decimal_places=2)
+    Cart.objects.update(
+        item_count=Coalesce(
+            Subquery(
+                items.annotate(total=Sum("quantity")).values("total"),
+                output_field=count_field,
+            ),
+            Value(0, output_field=count_field),
+        ),
+        subtotal=Coalesce(
+            Subquery(
+                items.annotate(
+                    total=Sum(
+                        F("quantity") * F("product__price"),
+                        output_field=subtotal_field,
+                    )
+                ).values("total"),
+                output_field=subtotal_field,
+            ),
+            Value(Decimal("0.00"), output_field=subtotal_field),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ordering_app", "0011_productdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="item_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Item Count"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="subtotal",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                max_digits=12,
+                verbose_name="Subtotal",
+            ),
+        ),
+        migrations.RunPython(backfill_cart_summaries, migrations.RunPython.noop),
+    ]
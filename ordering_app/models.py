@@ -1,4 +1,8 @@
+import math
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Sum, Window
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
@@ -14,6 +18,7 @@ class Supplier(models.Model):
     )
     email = models.EmailField(blank=True, null=True, verbose_name=_("Email"))
     address = models.TextField(blank=True, null=True, verbose_name=_("Address"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
 
     def __str__(self):
         return self.name
@@ -26,6 +31,7 @@ class Supplier(models.Model):
 class Category(models.Model):
     external_id = models.IntegerField(unique=True, verbose_name=_("External ID"))
     name = models.CharField(max_length=255, verbose_name=_("Name"))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
 
     def __str__(self):
         return self.name
@@ -35,6 +41,11 @@ class Category(models.Model):
         verbose_name_plural = _("Categories")
 
 
+# Значение import_hash у товаров, снятых с продажи пакетным импортом
+# (их нет в последнем файле поставщика).
+REMOVED_IMPORT_HASH = "removed"
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255, verbose_name=_("Product Name"))
     description = models.TextField(blank=True, null=True, verbose_name=_("Description"))
@@ -59,13 +70,57 @@ class Product(models.Model):
     stock_quantity = models.PositiveIntegerField(
         default=0, verbose_name=_("Stock Quantity")
     )
+    external_id = models.BigIntegerField(
+        blank=True, null=True, verbose_name=_("External ID")
+    )
+    import_hash = models.CharField(
+        max_length=32, blank=True, default="", verbose_name=_("Import Hash")
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Хэш описывает данные товара на момент пакетного импорта. После
+        # правки в обход него (админка, обычный load_data) хэш сбрасывается,
+        # чтобы следующий импорт не счёл товар неизменённым.
+        if self.import_hash:
+            self.import_hash = ""
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "import_hash"}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = _("Product")
         verbose_name_plural = _("Products")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["supplier", "external_id"],
+                name="unique_product_supplier_external_id",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["category", "price"], name="product_category_price_idx"
+            ),
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
+
+
+class CatalogState(models.Model):
+    version = models.PositiveBigIntegerField(default=0, verbose_name=_("Version"))
+    updated_at = models.DateTimeField(
+        default=timezone.now, verbose_name=_("Last Updated")
+    )
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+    class Meta:
+        verbose_name = _("Catalog State")
+        verbose_name_plural = _("Catalog State")
 
 
 class ProductAttribute(models.Model):
@@ -81,6 +136,17 @@ class ProductAttribute(models.Model):
         verbose_name_plural = _("Product Attributes")
 
 
+def parse_numeric_value(value):
+    # "6.1", "6,1", "256" -> число; "1920x1080", "True", "nan" -> None.
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(str(value).strip().replace(",", "."))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
 class ProductAttributeValue(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="attribute_values"
@@ -89,14 +155,52 @@ class ProductAttributeValue(models.Model):
         ProductAttribute, on_delete=models.CASCADE, related_name="values"
     )
     value = models.CharField(max_length=255, verbose_name=_("Value"))
+    numeric_value = models.FloatField(
+        null=True, blank=True, editable=False, verbose_name=_("Numeric Value")
+    )
 
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name}: {self.value}"
 
+    def save(self, *args, **kwargs):
+        self.numeric_value = parse_numeric_value(self.value)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = _("Product Attribute Value")
         verbose_name_plural = _("Product Attribute Values")
         unique_together = ("product", "attribute")
+        indexes = [
+            models.Index(
+                fields=["attribute", "value", "product"],
+                name="attr_value_product_idx",
+            ),
+            models.Index(
+                fields=["attribute", "numeric_value", "product"],
+                name="attr_numeric_product_idx",
+            ),
+        ]
+
+
+class ProductDocument(models.Model):
+    # Готовое представление товара для чтения: поставщик, категория и
+    # атрибуты уже встроены, поэтому список отдаётся одним запросом без JOIN.
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="document",
+        verbose_name=_("Product"),
+    )
+    data = models.JSONField(verbose_name=_("Data"))
+    updated_at = models.DateTimeField(verbose_name=_("Last Updated"))
+
+    def __str__(self):
+        return f"Document for product {self.product_id}"
+
+    class Meta:
+        verbose_name = _("Product Document")
+        verbose_name_plural = _("Product Documents")
 
 
 class Customer(models.Model):
@@ -217,6 +321,17 @@ class Cart(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Date Created"))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("Last Updated"))
+    # Сводка для значка корзины, см. ordering_app.carts.refresh_cart_summaries.
+    item_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("Item Count")
+    )
+    subtotal = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+        verbose_name=_("Subtotal"),
+    )
 
     def __str__(self):
         return f"Cart of {self.user.email}"
@@ -225,9 +340,29 @@ class Cart(models.Model):
         verbose_name = _("Cart")
         verbose_name_plural = _("Carts")
 
+    def get_total(self):
+        total = self.items.aggregate(total=Sum(cart_line_total()))["total"]
+        return total if total is not None else Decimal("0.00")
+
     def get_total_price(self):
-        total = sum(item.get_item_total() for item in self.items.all())
-        return total
+        return self.get_total()
+
+
+def cart_line_total():
+    return ExpressionWrapper(
+        F("quantity") * F("product__price"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        # Сумма строки и итог всей корзины (оконная сумма по cart_id)
+        # считаются в том же запросе, что читает позиции с товарами.
+        return self.select_related("product").annotate(
+            line_total=cart_line_total(),
+            cart_total=Window(Sum(cart_line_total()), partition_by=[F("cart_id")]),
+        )
 
 
 class CartItem(models.Model):
@@ -237,6 +372,8 @@ class CartItem(models.Model):
     )
     quantity = models.PositiveIntegerField(default=1, verbose_name=_("Quantity"))
 
+    objects = CartItemQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name} (Cart ID: {self.cart.pk})"
 
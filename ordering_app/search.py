@@ -0,0 +1,169 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from ordering_app.models import Product, ProductAttributeValue, Supplier
+
+SEARCH_TABLE = "ordering_app_product_search"
+
+# Вес столбцов для bm25: совпадение в названии важнее, чем в описании.
+SEARCH_WEIGHTS = (10.0, 1.0, 3.0, 2.0)
+
+INDEX_BATCH_SIZE = 500
+
+
+def _chunks(product_ids):
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), INDEX_BATCH_SIZE):
+        yield product_ids[start : start + INDEX_BATCH_SIZE]
+
+
+def search_supported():
+    # Полнотекстовый индекс есть только в SQLite (FTS5); на других СУБД
+    # поиск работает через обычные фильтры.
+    return connection.vendor == "sqlite"
+
+
+def build_match_query(text):
+    # Каждое слово берётся в кавычки, чтобы спецсимволы FTS5 из запроса
+    # не ломали синтаксис; последнее слово ищется по префиксу.
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _index_source_sql(where):
+    qn = connection.ops.quote_name
+    product = qn(Product._meta.db_table)
+    supplier = qn(Supplier._meta.db_table)
+    values = qn(ProductAttributeValue._meta.db_table)
+    return (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, supplier, attributes) "
+        f"SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(s.name, ''), "
+        f"COALESCE((SELECT group_concat(v.value, ' ') FROM {values} v "
+        f"WHERE v.product_id = p.id), '') "
+        f"FROM {product} p LEFT JOIN {supplier} s ON s.id = p.supplier_id {where}"
+    )
+
+
+def index_products(product_ids):
+    if not search_supported():
+        return
+    with connection.cursor() as cursor:
+        for batch in _chunks(product_ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", batch
+            )
+            cursor.execute(_index_source_sql(f"WHERE p.id IN ({placeholders})"), batch)
+
+
+def unindex_products(product_ids):
+    if not search_supported():
+        return
+    with connection.cursor() as cursor:
+        for batch in _chunks(product_ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", batch
+            )
+
+
+def rebuild_search_index():
+    if not search_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(_index_source_sql(""))
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+class ProductSearch:
+    # Ленивая выборка результатов поиска, совместимая с пагинацией DRF:
+    # count() и срез выполняют по одному запросу к индексу FTS5, товары
+    # страницы затем читаются по первичному ключу в порядке релевантности.
+    # bm25 считается по всем совпадениям, но упорядочиваются только
+    # CATALOG_SEARCH_RANK_WINDOW лучших из них (LIMIT даёт SQLite выбрать
+    # верхушку без полной сортировки): для слов, встречающихся в десятках
+    # тысяч товаров, полная сортировка стоит сотни миллисекунд. Остальные
+    # совпадения отдаются после ранжированных в порядке id, поэтому страницы
+    # не пересекаются.
+
+    def __init__(self, text, queryset=None):
+        self.match = build_match_query(text)
+        self.text = text
+        self.queryset = Product.objects.all() if queryset is None else queryset
+
+    def count(self):
+        if self.match is None:
+            return 0
+        if not search_supported():
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError("ProductSearch supports only slicing.")
+        if self.match is None:
+            return []
+        if not search_supported():
+            return list(self._fallback().order_by("id")[item])
+
+        offset = item.start or 0
+        stop = self.count() if item.stop is None else item.stop
+        window = settings.CATALOG_SEARCH_RANK_WINDOW
+        ranked = (
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY {self._score()}, rowid LIMIT %s OFFSET %s"
+        )
+        ids = []
+        with connection.cursor() as cursor:
+            if offset < window:
+                cursor.execute(ranked, [self.match, min(stop, window) - offset, offset])
+                ids += [row[0] for row in cursor.fetchall()]
+            if stop > window:
+                tail_offset = max(offset, window)
+                cursor.execute(
+                    f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                    f"AND rowid NOT IN ({ranked}) ORDER BY rowid LIMIT %s OFFSET %s",
+                    [
+                        self.match,
+                        self.match,
+                        window,
+                        0,
+                        stop - tail_offset,
+                        tail_offset - window,
+                    ],
+                )
+                ids += [row[0] for row in cursor.fetchall()]
+        products = self.queryset.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+    def _score(self):
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        return f"bm25({SEARCH_TABLE}, {weights})"
+
+    def _fallback(self):
+        condition = Q()
+        for word in re.findall(r"\w+", self.text or ""):
+            condition &= (
+                Q(name__icontains=word)
+                | Q(description__icontains=word)
+                | Q(supplier__name__icontains=word)
+                | Q(attribute_values__value__icontains=word)
+            )
+        return self.queryset.filter(condition).distinct()
@@ -0,0 +1,159 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from ordering_app.carts import refresh_carts, refresh_carts_for_products
+from ordering_app.catalog import bump_catalog_version
+from ordering_app.documents import refresh_product_documents
+from ordering_app.models import (
+    Category,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    Supplier,
+)
+from ordering_app.search import index_products, unindex_products
+
+CATALOG_MODELS = (
+    Supplier,
+    Category,
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+)
+
+
+class CatalogChanges:
+    # Изменения каталога, накопленные внутри collect_catalog_changes():
+    # товар с N атрибутами, сохранённый построчно, пересобирается один
+    # раз, а не N + 1 раз, и версия каталога увеличивается тоже один раз.
+
+    def __init__(self):
+        self.catalog = False
+        self.product_ids = set()
+        self.repriced_ids = set()
+
+    def flush(self):
+        if self.catalog:
+            bump_catalog_version()
+        if self.product_ids:
+            product_ids = list(self.product_ids)
+            index_products(product_ids)
+            refresh_product_documents(product_ids)
+        if self.repriced_ids:
+            # Цена могла измениться — пересчитываются сводки корзин с товаром.
+            refresh_carts_for_products(self.repriced_ids)
+
+
+_collecting = threading.local()
+
+
+@contextmanager
+def collect_catalog_changes():
+    # Производные данные пересобираются при выходе из блока, в той же
+    # транзакции, что и сами изменения: вызывающий открывает блок внутри
+    # transaction.atomic(). При исключении пересборка не выполняется —
+    # транзакция всё равно откатится. Вложенные блоки копят изменения во внешний.
+    if getattr(_collecting, "changes", None) is not None:
+        yield
+        return
+    changes = _collecting.changes = CatalogChanges()
+    try:
+        yield
+    finally:
+        _collecting.changes = None
+    changes.flush()
+
+
+def record_changes(catalog=False, product_ids=(), repriced_ids=()):
+    changes = getattr(_collecting, "changes", None)
+    immediate = changes is None
+    if immediate:
+        changes = CatalogChanges()
+    changes.catalog |= catalog
+    changes.product_ids.update(product_ids)
+    changes.repriced_ids.update(repriced_ids)
+    if immediate:
+        changes.flush()
+
+
+def catalog_changed(sender, raw=False, **kwargs):
+    if not raw:
+        record_changes(catalog=True)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model)
+    post_delete.connect(catalog_changed, sender=model)
+
+
+# Поисковый индекс и документы товаров обновляются точечно по изменённым
+# товарам, в том числе при loaddata: запросы читают только уже сохранённые
+# строки. Массовая загрузка (load_data --bulk/--stream) обходит сигналы и
+# обновляет их пачками сама.
+
+
+def products_changed(product_ids):
+    record_changes(product_ids=product_ids)
+
+
+def product_saved(sender, instance, created=False, **kwargs):
+    record_changes(
+        product_ids=[instance.pk], repriced_ids=[] if created else [instance.pk]
+    )
+
+
+def product_deleting(sender, instance, **kwargs):
+    # Позиции корзин удаляются каскадом вместе с товаром.
+    instance._changed_cart_ids = list(
+        instance.cart_items.values_list("cart_id", flat=True)
+    )
+
+
+def product_deleted(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+    refresh_carts(getattr(instance, "_changed_cart_ids", []))
+
+
+def attribute_value_changed(sender, instance, **kwargs):
+    products_changed([instance.product_id])
+
+
+def attribute_value_deleted(sender, instance, origin=None, **kwargs):
+    # При удалении самого товара его атрибуты удаляются каскадом раньше
+    # него, и пересобирать документ уже не нужно.
+    if isinstance(origin, Product) or getattr(origin, "model", None) is Product:
+        return
+    products_changed([instance.product_id])
+
+
+def attribute_renamed(sender, instance, created=False, **kwargs):
+    if not created:
+        products_changed(instance.values.values_list("product_id", flat=True))
+
+
+def related_saved(sender, instance, **kwargs):
+    products_changed(instance.products.values_list("pk", flat=True))
+
+
+def related_deleting(sender, instance, **kwargs):
+    # После удаления ссылка у товаров уже обнулена, поэтому их список
+    # запоминается заранее.
+    instance._changed_product_ids = list(instance.products.values_list("pk", flat=True))
+
+
+def related_deleted(sender, instance, **kwargs):
+    products_changed(getattr(instance, "_changed_product_ids", []))
+
+
+post_save.connect(product_saved, sender=Product)
+pre_delete.connect(product_deleting, sender=Product)
+post_delete.connect(product_deleted, sender=Product)
+post_save.connect(attribute_value_changed, sender=ProductAttributeValue)
+post_delete.connect(attribute_value_deleted, sender=ProductAttributeValue)
+post_save.connect(attribute_renamed, sender=ProductAttribute)
+for model in (Supplier, Category):
+    post_save.connect(related_saved, sender=model)
+    pre_delete.connect(related_deleting, sender=model)
+    post_delete.connect(related_deleted, sender=model)
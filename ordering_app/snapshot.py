@@ -0,0 +1,226 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import groupby, islice
+
+from django.conf import settings
+
+from ordering_app.api.fastpath import ValuesPlan
+from ordering_app.api.serializers import (
+    CategorySerializer,
+    ProductSerializer,
+    SupplierSerializer,
+)
+from ordering_app.catalog import get_catalog_version
+from ordering_app.models import Category, Product, ProductAttributeValue, Supplier
+
+# Формат файла (порядок байтов — родной для машины, снимок собирается на
+# том же хосте, где его читают воркеры):
+#   заголовок   MAGIC, версия формата, длина токена, токен версии каталога;
+#   таблица     для каждой секции: число записей, смещение данных,
+#               смещение массива ключей;
+#   секции      данные — подряд идущие JSON-записи, затем выровненные по
+#               8 байт массивы id (по возрастанию) и смещений записей
+#               (count + 1 значение, конец i-й записи — начало i+1-й).
+MAGIC = b"OSNP"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("=4sII")
+SECTION = struct.Struct("=QQQ")
+SECTIONS = ("products", "categories", "suppliers", "attributes")
+# Записи совпадают с ответами /api/<ресурс>/{id}/.
+RECORD_SECTIONS = {
+    "products": (Product, ProductSerializer),
+    "categories": (Category, CategorySerializer),
+    "suppliers": (Supplier, SupplierSerializer),
+}
+CHUNK_SIZE = 2000
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _iter_records(model, serializer_class):
+    plan = ValuesPlan.for_serializer(serializer_class())
+    values = plan.values(model.objects.order_by("id"), extra=["id"]).iterator(
+        chunk_size=CHUNK_SIZE
+    )
+    while chunk := list(islice(values, CHUNK_SIZE)):
+        for row, record in zip(chunk, plan.rows(chunk)):
+            yield row["id"], record
+
+
+def _iter_attributes():
+    # Атрибуты товара словарём {название: значение}, как в ?expand=attributes.
+    values = (
+        ProductAttributeValue.objects.order_by("product_id")
+        .values_list("product_id", "attribute__name", "value")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for product_id, group in groupby(values, key=lambda row: row[0]):
+        yield product_id, {name: value for _, name, value in sorted(group)}
+
+
+def _encode(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_section(file, records):
+    data_offset = file.tell()
+    ids = array("Q")
+    offsets = array("Q", [0])
+    position = 0
+    for pk, record in records:
+        blob = _encode(record)
+        file.write(blob)
+        position += len(blob)
+        ids.append(pk)
+        offsets.append(position)
+    file.write(b"\0" * (-file.tell() % 8))
+    keys_offset = file.tell()
+    file.write(ids.tobytes())
+    file.write(offsets.tobytes())
+    return len(ids), data_offset, keys_offset
+
+
+def build_snapshot(path):
+    # Снимок пишется во временный файл рядом и подменяется через os.replace:
+    # воркеры видят либо старый файл целиком, либо новый. Уже открытые
+    # отображения старого файла остаются рабочими, пока их не закроют.
+    # Сборка идёт без transaction.atomic(): при transaction_mode IMMEDIATE
+    # такая транзакция взяла бы блокировку записи и остановила бы
+    # корзины на всё время сборки. Каждый раздел читается одним запросом.
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            # Версия читается до данных: если каталог изменится во время
+            # сборки, снимок окажется устаревшим, а не наоборот.
+            token = get_catalog_version().encode("ascii")
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(token)))
+            file.write(token)
+            table_offset = file.tell()
+            file.write(b"\0" * SECTION.size * len(SECTIONS))
+
+            table = []
+            counts = {}
+            for name in SECTIONS:
+                if name == "attributes":
+                    section = _iter_attributes()
+                else:
+                    section = _iter_records(*RECORD_SECTIONS[name])
+                table.append(_write_section(file, section))
+                counts[name] = table[-1][0]
+
+            file.seek(table_offset)
+            for entry in table:
+                file.write(SECTION.pack(*entry))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return counts
+
+
+class CatalogSnapshot:
+    # Файл снимка, отображённый в память только на чтение: страницы
+    # разделяются всеми воркерами через page cache ОС, а поиск записи —
+    # двоичный поиск по массиву id без разбора всего файла.
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        try:
+            magic, format_version, token_length = HEADER.unpack_from(view, 0)
+        except struct.error:
+            raise SnapshotError(f"{path}: файл повреждён.")
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise SnapshotError(f"{path}: неизвестный формат снимка.")
+        self.version = bytes(view[HEADER.size : HEADER.size + token_length]).decode(
+            "ascii"
+        )
+
+        self.sections = {}
+        table_offset = HEADER.size + token_length
+        for index, name in enumerate(SECTIONS):
+            count, data_offset, keys_offset = SECTION.unpack_from(
+                view, table_offset + index * SECTION.size
+            )
+            end = keys_offset + 8 * (2 * count + 1)
+            if end > len(view):
+                raise SnapshotError(f"{path}: файл обрезан.")
+            self.sections[name] = (
+                view[keys_offset : keys_offset + 8 * count].cast("Q"),
+                view[keys_offset + 8 * count : end].cast("Q"),
+                data_offset,
+            )
+
+    def get(self, section, pk):
+        ids, offsets, data_offset = self.sections[section]
+        position = bisect_left(ids, pk)
+        if position == len(ids) or ids[position] != pk:
+            return None
+        start = data_offset + offsets[position]
+        end = data_offset + offsets[position + 1]
+        return json.loads(self._mmap[start:end])
+
+    def get_many(self, section, pks):
+        records = {}
+        for pk in pks:
+            record = self.get(section, pk)
+            if record is not None:
+                records[pk] = record
+        return records
+
+    def __len__(self):
+        return len(self.sections["products"][0])
+
+
+_snapshot = None
+_checked_at = 0.0
+_load_lock = threading.Lock()
+
+
+def get_catalog_snapshot():
+    # Снимок открывается при первом обращении; раз в
+    # CATALOG_SNAPSHOT_CHECK_INTERVAL секунд проверяется, не опубликован ли
+    # новый файл (другой inode или время изменения), и тогда он заменяет
+    # старый. Нет файла или он повреждён — возвращается None, и чтение идёт
+    # из базы.
+    global _snapshot, _checked_at
+
+    path = settings.CATALOG_SNAPSHOT_PATH
+    if not path:
+        return None
+    snapshot = _snapshot
+    now = time.monotonic()
+    if (
+        snapshot is not None
+        and now - _checked_at < settings.CATALOG_SNAPSHOT_CHECK_INTERVAL
+    ):
+        return snapshot
+
+    with _load_lock:
+        _checked_at = now
+        try:
+            stat = os.stat(path)
+        except OSError:
+            _snapshot = None
+            return None
+        identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if _snapshot is None or _snapshot.identity != identity:
+            try:
+                _snapshot = CatalogSnapshot(path)
+            except (OSError, ValueError, SnapshotError):
+                _snapshot = None
+        return _snapshot
@@ -1,10 +1,40 @@
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from decimal import Decimal
-from django.test import TestCase, Client
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase, APIClient
 from django.urls import reverse
-from ordering_app.models import Product, Category, Cart, CartItem, Order, Customer
+from ordering_app.models import (
+    Product,
+    ProductAttribute,
+    ProductAttributeValue,
+    ProductDocument,
+    Supplier,
+    Category,
+    Cart,
+    CartItem,
+    Order,
+    OrderItem,
+    Customer,
+)
+from ordering_app.carts import refresh_carts
+from ordering_app.catalog import get_catalog_state
+from ordering_app.feeds import FeedError, StreamingFeed
+from ordering_app.guest_carts import cart_key, get_cache, issue_token
+from ordering_app.signals import collect_catalog_changes
+from ordering_app.snapshot import CatalogSnapshot, build_snapshot
 from ordering_app.api.serializers import (
     CartItemSerializer,
     OrderSerializer,
@@ -108,7 +138,23 @@ class APITests(APITestCase):
         products_url = "/api/products/"
         response = self.client.get(products_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_products_list_cursor_pagination(self):
+        response = self.client.get("/api/products/", {"page_size": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product["id"] for product in response.data["results"]],
+            [self.product1.pk],
+        )
+        self.assertIsNone(response.data["previous"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [product["id"] for product in response.data["results"]],
+            [self.product2.pk],
+        )
+        self.assertIsNone(response.data["next"])
 
     def test_add_item_to_cart(self):
         cart_items_url = reverse("cart-item-list")
@@ -212,3 +258,1477 @@ class APITests(APITestCase):
         confirm_url = reverse("order-confirm-order", kwargs={"pk": order_id})
         response = self.client.patch(confirm_url, {"status": "confirmed"})
         self.assertEqual(response.status_code, 403)
+
+
+@pytest.mark.django_db
+class LoadDataTests(TestCase):
+    data_file = Path(__file__).resolve().parent.parent / "data.yml"
+
+    def load(self, *args):
+        self.load_paths(str(self.data_file), *args)
+
+    def load_paths(self, *args):
+        call_command("load_data", *args, stdout=StringIO(), stderr=StringIO())
+
+    def snapshot(self):
+        return sorted(
+            (
+                product.name,
+                product.price,
+                product.stock_quantity,
+                product.category.external_id,
+                tuple(
+                    sorted(
+                        product.attribute_values.values_list("attribute__name", "value")
+                    )
+                ),
+            )
+            for product in Product.objects.select_related("category")
+        )
+
+    def test_bulk_import_matches_regular_import(self):
+        self.load()
+        expected = self.snapshot()
+        Product.objects.all().delete()
+
+        self.load("--bulk", "--batch-size", "4")
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_stream_import_matches_regular_import(self):
+        self.load()
+        expected = self.snapshot()
+        Product.objects.all().delete()
+
+        self.load("--stream", "--batch-size", "5")
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_import_directory_with_several_suppliers(self):
+        source = self.data_file.read_text(encoding="utf-8")
+        with TemporaryDirectory() as directory:
+            for shop in ("Shop A", "Shop B"):
+                Path(directory, f"{shop}.yml").write_text(
+                    source.replace("shop: Связной", f"shop: {shop}"), encoding="utf-8"
+                )
+            self.load_paths(directory)
+
+        per_supplier = dict(
+            Product.objects.values_list("supplier__name").annotate(Count("id"))
+        )
+        self.assertEqual(per_supplier, {"Shop A": 14, "Shop B": 14})
+
+    def test_suppliers_sharing_a_sku_keep_their_products(self):
+        with TemporaryDirectory() as directory:
+            for shop, external_id in (("Shop A", 100), ("Shop B", 200)):
+                Path(directory, f"{shop}.yml").write_text(
+                    f"shop: {shop}\n"
+                    f"goods:\n"
+                    f"  - id: {external_id}\n"
+                    f"    sku: SHARED-1\n"
+                    f"    name: Кабель\n"
+                    f"    price: 100\n",
+                    encoding="utf-8",
+                )
+            for args in ((), ("--bulk",), ("--bulk",)):
+                out = StringIO()
+                call_command("load_data", directory, *args, stdout=out)
+                self.assertEqual(
+                    sorted(
+                        Product.objects.values_list("supplier__name", "external_id")
+                    ),
+                    [("Shop A", 100), ("Shop B", 200)],
+                )
+            self.assertIn("без изменений: 2", out.getvalue())
+
+    def test_malformed_feed_fails_only_its_file(self):
+        with TemporaryDirectory() as directory:
+            Path(directory, "a.yml").write_text(
+                self.data_file.read_text(encoding="utf-8"), encoding="utf-8"
+            )
+            Path(directory, "b.yml").write_text("- shop: x\n", encoding="utf-8")
+            Path(directory, "c.yml").write_text("shop\n", encoding="utf-8")
+            for workers in ("1", "2"):
+                err = StringIO()
+                with self.assertRaisesMessage(CommandError, "b.yml"):
+                    call_command(
+                        "load_data",
+                        directory,
+                        "--workers",
+                        workers,
+                        stdout=StringIO(),
+                        stderr=err,
+                    )
+                self.assertIn("c.yml", err.getvalue())
+                self.assertEqual(Product.objects.count(), 14)
+
+    def test_bulk_reimport_touches_only_changed_goods(self):
+        self.load("--bulk")
+        source = self.data_file.read_text(encoding="utf-8")
+        source = source.replace("price: 110000", "price: 99000")
+        source = source[: source.index("  - id: 123424576")]
+        with TemporaryDirectory() as directory:
+            feed = Path(directory, "feed.yml")
+            feed.write_text(source, encoding="utf-8")
+            out = StringIO()
+            call_command("load_data", str(feed), "--bulk", stdout=out)
+
+        self.assertIn(
+            "создано: 0, обновлено: 1, без изменений: 12, удалено: 1", out.getvalue()
+        )
+        self.assertEqual(
+            Product.objects.get(external_id=4216292).price, Decimal("99000")
+        )
+        self.assertEqual(Product.objects.get(external_id=123424576).stock_quantity, 0)
+
+    def test_bulk_reimport_overwrites_changes_made_elsewhere(self):
+        self.load("--bulk")
+        source = self.data_file.read_text(encoding="utf-8").replace(
+            "price: 110000", "price: 99000"
+        )
+        with TemporaryDirectory() as directory:
+            feed = Path(directory, "feed.yml")
+            feed.write_text(source, encoding="utf-8")
+            self.load_paths(str(feed))
+            Path(directory, "stock.csv").write_text(
+                "external_id,price,quantity\n4216313,1.00,1\n", encoding="utf-8"
+            )
+            call_command(
+                "sync_stock",
+                str(Path(directory, "stock.csv")),
+                "--supplier",
+                "Связной",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        self.assertEqual(
+            Product.objects.get(external_id=4216313).price, Decimal("1.00")
+        )
+
+        out = StringIO()
+        call_command("load_data", str(self.data_file), "--bulk", stdout=out)
+        self.assertIn("удалено: 0", out.getvalue())
+        self.assertEqual(
+            Product.objects.get(external_id=4216292).price, Decimal("110000")
+        )
+        self.assertFalse(Product.objects.filter(price=Decimal("1.00")).exists())
+
+        # Снятый с продажи товар не считается удалённым повторно.
+        product = Product.objects.get(external_id=4216292)
+        source = self.data_file.read_text(encoding="utf-8")
+        source = source[: source.index("  - id: 123424576")]
+        with TemporaryDirectory() as directory:
+            feed = Path(directory, "feed.yml")
+            feed.write_text(source, encoding="utf-8")
+            for expected in ("удалено: 1", "удалено: 0"):
+                out = StringIO()
+                call_command("load_data", str(feed), "--bulk", stdout=out)
+                self.assertIn(expected, out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.price, Decimal("110000"))
+
+    def test_bulk_import_skips_malformed_goods(self):
+        source = self.data_file.read_text(encoding="utf-8")
+        source = source.replace(
+            "goods:\n",
+            "goods:\n"
+            "  - 5\n"
+            "  - id: 1\n    name: Товар\n    price: 10\n    parameters: [1, 2]\n"
+            "  - id: 2\n    name: [Товар]\n    price: 10\n"
+            "  - id: 3\n    name: Товар\n    price: 10\n    quantity: -1\n"
+            "  - id: 4\n    name: Товар\n    price: .nan\n"
+            "  - id: 5\n    name: Товар\n    price: -.inf\n"
+            "  - id: 6\n    name: Товар\n    price: 1000000000000\n"
+            "  - id: 7\n    name: Товар\n    price: 99999999.999\n"
+            "  - id: 8\n    name: Товар\n    price: -10\n",
+        )
+        with TemporaryDirectory() as directory:
+            feed = Path(directory, "feed.yml")
+            feed.write_text(source, encoding="utf-8")
+            for mode in ("--bulk", "--stream"):
+                out = StringIO()
+                call_command(
+                    "load_data", str(feed), mode, stdout=out, stderr=StringIO()
+                )
+                self.assertIn("пропущено: 9", out.getvalue())
+                self.assertEqual(Product.objects.count(), 14)
+
+    def test_reimport_matches_goods_by_external_id(self):
+        source = self.data_file.read_text(encoding="utf-8").replace(
+            "name: Смартфон Apple iPhone XS Max 512GB (золотистый)",
+            "name: Apple iPhone XS Max 512GB",
+        )
+        for mode in ([], ["--bulk"]):
+            self.load()
+            product_id = Product.objects.get(external_id=4216292).pk
+            with TemporaryDirectory() as directory:
+                feed = Path(directory, "feed.yml")
+                feed.write_text(source, encoding="utf-8")
+                self.load_paths(str(feed), *mode)
+
+            self.assertEqual(Product.objects.count(), 14)
+            product = Product.objects.get(external_id=4216292)
+            self.assertEqual(product.pk, product_id)
+            self.assertEqual(product.name, "Apple iPhone XS Max 512GB")
+            Product.objects.all().delete()
+
+    def test_generated_catalog_imports(self):
+        with TemporaryDirectory() as directory:
+            feed = Path(directory, "catalog.yml")
+            call_command(
+                "generate_catalog",
+                str(feed),
+                "--goods",
+                "50",
+                "--categories",
+                "3",
+                "--attributes",
+                "8",
+                stdout=StringIO(),
+            )
+            self.load_paths(str(feed), "--stream", "--batch-size", "20")
+
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertEqual(Category.objects.count(), 3)
+        weights = ProductAttributeValue.objects.filter(attribute__name="Вес (г)")
+        self.assertTrue(weights.exists())
+        self.assertFalse(weights.filter(numeric_value__isnull=True).exists())
+        self.assertFalse(
+            ProductAttributeValue.objects.filter(
+                attribute__name="Цвет", numeric_value__isnull=False
+            ).exists()
+        )
+
+    def test_stream_anchors_do_not_accumulate(self):
+        source = "shop: Связной\ndefaults: &base\n  price: 10\ngoods:\n" + "".join(
+            f"  - &good{index}\n    <<: *base\n    id: {index}\n"
+            f"    name: &name{index} Товар {index}\n    description: *name{index}\n"
+            for index in range(50)
+        )
+        feed = StreamingFeed(StringIO(source))
+        goods = []
+        for good in feed.goods():
+            goods.append(good)
+            self.assertLessEqual(len(feed.anchors), 3)
+        self.assertEqual(len(goods), 50)
+        self.assertEqual((goods[7]["price"], goods[7]["description"]), (10, "Товар 7"))
+
+        feed = StreamingFeed(StringIO(source + "  - name: *name1\n    price: 1\n"))
+        with self.assertRaisesMessage(FeedError, "name1"):
+            list(feed.goods())
+
+    def test_bulk_reimport_updates_in_place(self):
+        self.load("--bulk")
+        ids = set(Product.objects.values_list("id", flat=True))
+        self.load("--bulk")
+        self.assertEqual(set(Product.objects.values_list("id", flat=True)), ids)
+        self.assertEqual(
+            ProductAttributeValue.objects.count(),
+            sum(len(item[4]) for item in self.snapshot()),
+        )
+
+
+@pytest.mark.django_db
+class SyncStockTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Test Supplier")
+        self.by_sku = Product.objects.create(
+            name="By SKU", price=Decimal("10.00"), sku="SKU-1", stock_quantity=1
+        )
+        self.by_external_id = Product.objects.create(
+            name="By External ID",
+            price=Decimal("20.00"),
+            supplier=self.supplier,
+            external_id=42,
+            stock_quantity=2,
+        )
+
+    def sync(self, filename, content, *args):
+        with TemporaryDirectory() as directory:
+            path = Path(directory, filename)
+            path.write_text(content, encoding="utf-8")
+            out = StringIO()
+            call_command("sync_stock", str(path), *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_sync_csv_by_sku(self):
+        output = self.sync(
+            "stock.csv", "sku,price,quantity\nSKU-1,12.50,7\nSKU-404,1,1\n"
+        )
+        self.by_sku.refresh_from_db()
+        self.assertEqual(self.by_sku.price, Decimal("12.50"))
+        self.assertEqual(self.by_sku.stock_quantity, 7)
+        self.assertIn("обновлено: 1, не найдено: 1", output)
+
+    def test_sync_jsonl_by_external_id_keeps_missing_fields(self):
+        self.sync(
+            "stock.jsonl",
+            '{"external_id": 42, "quantity": 0}\n',
+            "--supplier",
+            "Test Supplier",
+        )
+        self.by_external_id.refresh_from_db()
+        self.assertEqual(self.by_external_id.price, Decimal("20.00"))
+        self.assertEqual(self.by_external_id.stock_quantity, 0)
+
+    def test_sync_counts_unstorable_values_as_errors(self):
+        output = self.sync(
+            "stock.csv",
+            "sku,price,quantity\n"
+            "SKU-1,Infinity,1\n"
+            "SKU-1,NaN,1\n"
+            "SKU-1,99999999999999,1\n"
+            "SKU-1,1,99999999999999\n"
+            "SKU-1,12.50,7\n",
+        )
+        self.assertIn("обновлено: 1, не найдено: 0, ошибок: 4", output)
+        self.by_sku.refresh_from_db()
+        self.assertEqual(self.by_sku.price, Decimal("12.50"))
+        self.assertEqual(self.by_sku.document.data["price"], "12.50")
+
+    def test_sync_by_sku_updates_every_match_of_the_supplier(self):
+        other = Supplier.objects.create(name="Other Supplier")
+        same_sku = [
+            Product.objects.create(
+                name=f"Same SKU {index}",
+                price=Decimal("10.00"),
+                sku="SKU-2",
+                supplier=supplier,
+            )
+            for index, supplier in enumerate([self.supplier, self.supplier, other])
+        ]
+        output = self.sync(
+            "stock.csv",
+            "sku,price,quantity\nSKU-2,15.00,3\n",
+            "--supplier",
+            "Other Supplier",
+        )
+        self.assertIn("обновлено: 1, не найдено: 0", output)
+        self.assertEqual(
+            [product.document.data["price"] for product in same_sku],
+            ["10.00", "10.00", "15.00"],
+        )
+
+        output = self.sync("stock.csv", "sku,price,quantity\nSKU-2,12.00,3\n")
+        self.assertIn("обновлено: 3, не найдено: 0", output)
+        self.assertEqual(
+            ProductDocument.objects.filter(
+                product__in=same_sku, data__price="12.00"
+            ).count(),
+            3,
+        )
+
+
+@pytest.mark.django_db
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Cache Category", external_id=789)
+        Product.objects.create(
+            name="Cached Product", category=self.category, price=Decimal("10.00")
+        )
+
+    def test_catalog_list_served_from_cache(self):
+        first = self.client.get("/api/products/")
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(1):
+            second = self.client.get("/api/products/")
+        self.assertEqual(second.data, first.data)
+
+    def test_catalog_change_invalidates_cache(self):
+        self.client.get("/api/products/")
+        Product.objects.create(
+            name="New Product", category=self.category, price=Decimal("20.00")
+        )
+        response = self.client.get("/api/products/")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_bulk_import_invalidates_cache(self):
+        self.client.get("/api/categories/")
+        data_file = Path(__file__).resolve().parent.parent / "data.yml"
+        call_command("load_data", str(data_file), "--bulk", stdout=StringIO())
+        response = self.client.get("/api/categories/")
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_catalog_etag_not_modified(self):
+        response = self.client.get("/api/products/")
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        Product.objects.create(name="Changed", price=Decimal("1.00"))
+        response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_catalog_detail_if_modified_since(self):
+        product = Product.objects.get()
+        url = f"/api/products/{product.pk}/"
+        response = self.client.get(url)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogFilterTests(APITestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones", external_id=901)
+        self.tvs = Category.objects.create(name="TVs", external_id=902)
+        color = ProductAttribute.objects.create(name="Цвет")
+        memory = ProductAttribute.objects.create(name="Память")
+        goods = [
+            ("Red 64", self.phones, "100.00", "красный", "64"),
+            ("Red 128", self.phones, "200.00", "красный", "128"),
+            ("Black 64", self.phones, "150.00", "черный", "64"),
+            ("Black TV", self.tvs, "900.00", "черный", None),
+        ]
+        self.products = {}
+        for name, category, price, color_value, memory_value in goods:
+            product = Product.objects.create(
+                name=name, category=category, price=Decimal(price)
+            )
+            ProductAttributeValue.objects.create(
+                product=product, attribute=color, value=color_value
+            )
+            if memory_value:
+                ProductAttributeValue.objects.create(
+                    product=product, attribute=memory, value=memory_value
+                )
+            self.products[name] = product
+
+    def names(self, response):
+        return sorted(product["name"] for product in response.data["results"])
+
+    def test_filter_by_category_and_price(self):
+        response = self.client.get(
+            "/api/products/",
+            {"category": self.phones.pk, "price_min": "120", "price_max": "200"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(response), ["Black 64", "Red 128"])
+
+    def test_filter_by_attributes(self):
+        response = self.client.get(
+            "/api/products/?attr=Цвет:красный&attr=Цвет:черный&attr=Память:64"
+        )
+        self.assertEqual(self.names(response), ["Black 64", "Red 64"])
+
+        response = self.client.get("/api/products/?attr=Вес:1")
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.get("/api/products/?attr=Цвет")
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets_follow_filters(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(
+            response.data["facets"]["Цвет"],
+            [{"value": "красный", "count": 2}, {"value": "черный", "count": 2}],
+        )
+
+        response = self.client.get("/api/products/", {"category": self.phones.pk})
+        self.assertEqual(
+            response.data["facets"],
+            {
+                "Память": [
+                    {"value": "128", "count": 1},
+                    {"value": "64", "count": 2},
+                ],
+                "Цвет": [
+                    {"value": "красный", "count": 2},
+                    {"value": "черный", "count": 1},
+                ],
+            },
+        )
+
+    def test_filter_by_numeric_attribute_range(self):
+        self.assertEqual(
+            ProductAttributeValue.objects.get(
+                product=self.products["Red 128"], attribute__name="Память"
+            ).numeric_value,
+            128.0,
+        )
+        response = self.client.get("/api/products/?attr_gte=Память:100")
+        self.assertEqual(self.names(response), ["Red 128"])
+
+        response = self.client.get(
+            "/api/products/?attr_gte=Память:32&attr_lte=Память:64"
+        )
+        self.assertEqual(self.names(response), ["Black 64", "Red 64"])
+
+        response = self.client.get("/api/products/?attr_gte=Цвет:1")
+        self.assertEqual(response.data["results"], [])
+
+        response = self.client.get("/api/products/?attr_lte=Память:много")
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Связной")
+        self.phone = Product.objects.create(
+            name="Смартфон Apple iPhone 15",
+            description="Красный корпус",
+            supplier=self.supplier,
+            price=Decimal("900.00"),
+        )
+        self.case = Product.objects.create(
+            name="Чехол для смартфона",
+            description="Подходит для iPhone",
+            price=Decimal("10.00"),
+        )
+        color = ProductAttribute.objects.create(name="Цвет")
+        ProductAttributeValue.objects.create(
+            product=self.case, attribute=color, value="черный"
+        )
+
+    def search(self, query, **params):
+        response = self.client.get("/api/products/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product["id"] for product in response.data["results"]]
+
+    def test_search_ranks_name_matches_first(self):
+        self.assertEqual(self.search("iphone"), [self.phone.pk, self.case.pk])
+        self.assertEqual(self.search("смартф"), [self.phone.pk, self.case.pk])
+        self.assertEqual(self.search("черный"), [self.case.pk])
+        self.assertEqual(self.search("связной"), [self.phone.pk])
+        self.assertEqual(self.search("планшет"), [])
+
+    def test_search_requires_query(self):
+        response = self.client.get("/api/products/search/", {"q": " "})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_index_follows_changes(self):
+        self.phone.name = "Планшет Apple iPad"
+        self.phone.save()
+        self.assertEqual(self.search("планшет"), [self.phone.pk])
+
+        self.supplier.name = "Эльдорадо"
+        self.supplier.save()
+        self.assertEqual(self.search("эльдорадо"), [self.phone.pk])
+
+        self.case.delete()
+        self.assertEqual(self.search("черный"), [])
+
+    def test_search_pages_past_rank_window(self):
+        with self.settings(CATALOG_SEARCH_RANK_WINDOW=1):
+            first = self.search("iphone", limit=1)
+            second = self.search("iphone", limit=1, offset=1)
+        self.assertEqual(sorted(first + second), sorted([self.phone.pk, self.case.pk]))
+
+    def test_rank_window_keeps_best_matches(self):
+        body = Product.objects.create(name="Корпус Apple", price=Decimal("5.00"))
+        with self.settings(CATALOG_SEARCH_RANK_WINDOW=1):
+            self.assertEqual(self.search("корпус"), [body.pk, self.phone.pk])
+            self.assertEqual(self.search("корпус", limit=1, offset=1), [self.phone.pk])
+
+    def test_bulk_import_updates_search_index(self):
+        data_file = Path(__file__).resolve().parent.parent / "data.yml"
+        call_command("load_data", str(data_file), "--bulk", stdout=StringIO())
+        product = Product.objects.get(external_id=4216292)
+        self.assertEqual(self.search("xs max"), [product.pk])
+
+
+@override_settings(CATALOG_AUTOCOMPLETE_REFRESH_INTERVAL=0)
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Смартфоны", external_id=951)
+        self.supplier = Supplier.objects.create(name="Связной")
+        self.phone = Product.objects.create(
+            name="Смартфон Apple iPhone XR (Красный)",
+            category=self.category,
+            supplier=self.supplier,
+            price=Decimal("100.00"),
+        )
+
+    def suggest(self, query, **params):
+        response = self.client.get("/api/autocomplete/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(item["type"], item["name"]) for item in response.data["results"]]
+
+    def test_suggestions_match_word_prefixes(self):
+        self.assertEqual(
+            self.suggest("смартф"),
+            [("product", self.phone.name), ("category", "Смартфоны")],
+        )
+        self.assertEqual(self.suggest("iphone x"), [("product", self.phone.name)])
+        self.assertEqual(self.suggest("КРАСН"), [("product", self.phone.name)])
+        self.assertEqual(self.suggest("связ"), [("supplier", "Связной")])
+        self.assertEqual(
+            self.suggest("смартфоны", limit=1), [("category", "Смартфоны")]
+        )
+        self.assertEqual(self.suggest("планшет"), [])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_index_rebuilt_on_catalog_change(self):
+        self.assertEqual(self.suggest("ipad"), [])
+        Product.objects.create(name="Планшет Apple iPad", price=Decimal("50.00"))
+        self.assertEqual(self.suggest("ipad"), [("product", "Планшет Apple iPad")])
+
+    def test_suggestions_served_without_queries(self):
+        self.suggest("apple")
+        with self.settings(CATALOG_AUTOCOMPLETE_REFRESH_INTERVAL=60):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.suggest("apple"), [("product", self.phone.name)])
+
+
+class ProductDocumentTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Связной")
+        self.category = Category.objects.create(name="Смартфоны", external_id=961)
+        self.product = Product.objects.create(
+            name="Смартфон",
+            sku="SKU-1",
+            supplier=self.supplier,
+            category=self.category,
+            price=Decimal("100.00"),
+            stock_quantity=3,
+        )
+        self.color = ProductAttribute.objects.create(name="Цвет")
+        ProductAttributeValue.objects.create(
+            product=self.product, attribute=self.color, value="черный"
+        )
+
+    def document(self):
+        response = self.client.get(f"/api/product-documents/{self.product.pk}/")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_document_embeds_related_data(self):
+        document = self.document()
+        self.assertEqual(
+            document["supplier"], {"id": self.supplier.pk, "name": "Связной"}
+        )
+        self.assertEqual(document["category"]["name"], "Смартфоны")
+        self.assertEqual(document["attributes"], {"Цвет": "черный"})
+
+        product = self.client.get(f"/api/products/{self.product.pk}/").data
+        for field in ("name", "price", "sku", "stock_quantity", "updated_at"):
+            self.assertEqual(document[field], product[field])
+
+    def test_collected_changes_rebuild_once(self):
+        version = get_catalog_state()[0]
+        with CaptureQueriesContext(connection) as queries:
+            with collect_catalog_changes():
+                product = Product.objects.create(name="Чехол", price=Decimal("10.00"))
+                for index in range(5):
+                    attribute = ProductAttribute.objects.create(name=f"Атрибут {index}")
+                    ProductAttributeValue.objects.create(
+                        product=product, attribute=attribute, value=str(index)
+                    )
+                self.assertFalse(ProductDocument.objects.filter(pk=product.pk).exists())
+        self.assertEqual(get_catalog_state()[0], version + 1)
+        search_deletes = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("DELETE FROM ordering_app_product_search")
+        ]
+        self.assertEqual(len(search_deletes), 1)
+        self.assertEqual(
+            len(ProductDocument.objects.get(pk=product.pk).data["attributes"]), 5
+        )
+
+    def test_document_list_is_single_query(self):
+        with self.assertNumQueries(2):  # версия каталога и страница документов
+            response = self.client.get("/api/product-documents/")
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]], [self.product.pk]
+        )
+
+    def test_documents_follow_changes(self):
+        self.supplier.name = "Эльдорадо"
+        self.supplier.save()
+        self.color.name = "Окраска"
+        self.color.save()
+        self.assertEqual(self.document()["supplier"]["name"], "Эльдорадо")
+        self.assertEqual(self.document()["attributes"], {"Окраска": "черный"})
+
+        self.category.delete()
+        self.assertIsNone(self.document()["category"])
+
+        with TemporaryDirectory() as directory:
+            path = Path(directory, "stock.csv")
+            path.write_text("sku,price,quantity\nSKU-1,150.00,7\n", encoding="utf-8")
+            call_command("sync_stock", str(path), stdout=StringIO())
+        document = self.document()
+        self.assertEqual((document["price"], document["stock_quantity"]), ("150.00", 7))
+
+        self.product.delete()
+        self.assertFalse(ProductDocument.objects.exists())
+
+    def test_bulk_import_builds_documents(self):
+        data_file = Path(__file__).resolve().parent.parent / "data.yml"
+        call_command("load_data", str(data_file), "--bulk", stdout=StringIO())
+        product = Product.objects.get(external_id=4216292)
+        self.assertEqual(
+            product.document.data["attributes"]["Встроенная память (Гб)"], "512"
+        )
+        self.assertEqual(ProductDocument.objects.count(), Product.objects.count())
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(name="Связной")
+        self.category = Category.objects.create(name="Смартфоны", external_id=971)
+        color = ProductAttribute.objects.create(name="Цвет")
+        for index in range(3):
+            product = Product.objects.create(
+                name=f"Смартфон {index}",
+                description="Длинное описание",
+                supplier=self.supplier,
+                category=self.category,
+                price=Decimal("100.00"),
+            )
+            ProductAttributeValue.objects.create(
+                product=product, attribute=color, value="черный"
+            )
+
+    def test_fields_restrict_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/products/", {"fields": "id,name,price"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data["results"][0]), {"id", "name", "price"})
+        self.assertTrue(queries.captured_queries)
+        for query in queries.captured_queries:
+            self.assertNotIn('"ordering_app_product"."description"', query["sql"])
+
+        response = self.client.get("/api/products/", {"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_expand_related_in_fixed_queries(self):
+        params = {"fields": "id,name", "expand": "supplier,category,attributes"}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/products/", params)
+        product = response.data["results"][0]
+        self.assertEqual(product["supplier"]["name"], "Связной")
+        self.assertEqual(product["category"]["name"], "Смартфоны")
+        self.assertEqual(product["attributes"], {"Цвет": "черный"})
+
+        Product.objects.create(
+            name="Смартфон 4", supplier=self.supplier, price=Decimal("1.00")
+        )
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get("/api/products/", params)
+        self.assertEqual(len(response.data["results"]), 4)
+
+        response = self.client.get("/api/products/", {"expand": "orders"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_fields(self):
+        user = User.objects.create_user(username="fields_user", password="password")
+        product = Product.objects.first()
+        for _ in range(2):
+            order = Order.objects.create(user=user, status="new")
+            OrderItem.objects.create(order=order, product=product, price=product.price)
+        self.client.force_authenticate(user=user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/orders/", {"fields": "id,status"})
+        self.assertEqual(
+            [set(order) for order in response.data], [{"id", "status"}] * 2
+        )
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/orders/", {"fields": "id,items"})
+        self.assertEqual(len(response.data[0]["items"]), 1)
+
+
+class ValuesFastPathTests(APITestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Связной")
+        category = Category.objects.create(name="Смартфоны", external_id=971)
+        self.user = User.objects.create_user(username="fast_user", password="password")
+        for index in range(3):
+            product = Product.objects.create(
+                name=f"Смартфон {index}",
+                description=None if index else "Описание",
+                supplier=supplier if index else None,
+                category=category,
+                price=Decimal("99.90"),
+                sku=f"SKU-{index}",
+                external_id=index,
+            )
+            order = Order.objects.create(
+                user=self.user, status="new", total_amount=Decimal("199.80")
+            )
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                product_name=product.name,
+                price=product.price,
+                quantity=2,
+            )
+        Order.objects.create(user=self.user, status="confirmed")
+        self.client.force_authenticate(user=self.user)
+
+    def assertSameContent(self, url, params=None):
+        responses = []
+        for enabled in (True, False):
+            cache.clear()
+            with override_settings(API_VALUES_FAST_PATH=enabled):
+                response = self.client.get(url, params, HTTP_ACCEPT="application/json")
+            self.assertEqual(response.status_code, 200)
+            responses.append(response.content)
+        self.assertEqual(responses[0], responses[1])
+
+    def test_responses_are_byte_identical(self):
+        Product.objects.update(import_hash="e916f7")
+        self.assertSameContent("/api/products/")
+        self.assertNotIn(b"import_hash", self.client.get("/api/products/").content)
+        self.assertSameContent("/api/products/", {"page_size": 2})
+        self.assertSameContent(
+            "/api/products/", {"fields": "name,price", "page_size": 2}
+        )
+        self.assertSameContent("/api/products/", {"expand": "supplier"})
+        self.assertSameContent("/api/categories/")
+        self.assertSameContent("/api/suppliers/")
+        self.assertSameContent("/api/orders/")
+        self.assertSameContent("/api/orders/", {"fields": "id,items"})
+
+    def test_order_list_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/orders/")
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(response.data[0]["items"], [])
+
+
+class ProductBulkTests(APITestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Связной")
+        self.products = [
+            Product.objects.create(
+                name=f"Смартфон {index}",
+                supplier=supplier,
+                price=Decimal("100.00"),
+                sku=f"SKU-{index}",
+            )
+            for index in range(3)
+        ]
+
+    def test_bulk_lookup_in_request_order(self):
+        first, second, third = self.products
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                "/api/products/bulk/",
+                {"ids": f"{third.pk},{first.pk},999999", "skus": "SKU-1,SKU-0,NOPE"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [product["id"] for product in response.data["results"]],
+            [third.pk, first.pk, second.pk],
+        )
+        self.assertEqual(response.data["missing"], {"ids": [999999], "skus": ["NOPE"]})
+        self.assertEqual(
+            response.data["results"][0],
+            self.client.get(f"/api/products/{third.pk}/").data,
+        )
+
+    def test_bulk_lookup_with_fields_and_expand(self):
+        pk = self.products[0].pk
+        response = self.client.get(
+            "/api/products/bulk/", {"ids": str(pk), "skus": "SKU-2", "fields": "name"}
+        )
+        self.assertEqual(
+            response.data["results"], [{"name": "Смартфон 0"}, {"name": "Смартфон 2"}]
+        )
+
+        response = self.client.get(
+            "/api/products/bulk/",
+            {"skus": "SKU-1", "fields": "id", "expand": "supplier"},
+        )
+        self.assertEqual(response.data["results"][0]["supplier"]["name"], "Связной")
+        self.assertEqual(response.data["missing"], {"ids": [], "skus": []})
+
+    def test_bulk_lookup_validation(self):
+        self.assertEqual(self.client.get("/api/products/bulk/").status_code, 400)
+        response = self.client.get("/api/products/bulk/", {"ids": "1,x"})
+        self.assertEqual(response.status_code, 400)
+        with override_settings(CATALOG_BULK_MAX_ITEMS=2):
+            response = self.client.get("/api/products/bulk/", {"ids": "1,2,3"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CatalogExportTests(APITestCase):
+    def setUp(self):
+        supplier = Supplier.objects.create(name="Связной")
+        for index in range(5):
+            Product.objects.create(
+                name=f"Смартфон, {index}",
+                supplier=supplier,
+                price=Decimal("100.00"),
+            )
+
+    def test_ndjson_matches_api(self):
+        with override_settings(CATALOG_EXPORT_CHUNK_SIZE=2):
+            response = self.client.get("/api/products/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            rows, json.loads(self.client.get("/api/products/").content)["results"]
+        )
+
+    def test_csv_and_since(self):
+        response = self.client.get("/api/products/export/", {"output": "csv"})
+        rows = list(
+            csv.DictReader(StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["name"], "Смартфон, 0")
+        self.assertEqual(rows[0]["description"], "")
+
+        since = response["X-Export-Started-At"]
+        product = Product.objects.get(name="Смартфон, 3")
+        product.price = Decimal("90.00")
+        product.save()
+        response = self.client.get("/api/products/export/", {"since": since})
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(row)["id"] for row in rows], [product.pk])
+
+    def test_export_validation(self):
+        response = self.client.get("/api/products/export/", {"output": "xml"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/products/export/", {"since": "вчера"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / "products.csv"
+            call_command(
+                "export_catalog",
+                "--format",
+                "csv",
+                "--chunk-size",
+                "2",
+                "-o",
+                str(path),
+                stderr=StringIO(),
+            )
+            with open(path, encoding="utf-8", newline="") as file:
+                self.assertEqual(len(list(csv.DictReader(file))), 5)
+
+
+class CatalogSnapshotTests(APITestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = str(Path(self.directory.name) / "catalog.snapshot")
+        settings = override_settings(
+            CATALOG_SNAPSHOT_PATH=self.path, CATALOG_SNAPSHOT_CHECK_INTERVAL=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        supplier = Supplier.objects.create(name="Связной")
+        category = Category.objects.create(name="Смартфоны", external_id=971)
+        color = ProductAttribute.objects.create(name="Цвет")
+        self.product = Product.objects.create(
+            name="Смартфон",
+            supplier=supplier,
+            category=category,
+            price=Decimal("100.00"),
+        )
+        ProductAttributeValue.objects.create(
+            product=self.product, attribute=color, value="черный"
+        )
+        Product.objects.create(name="Чехол", price=Decimal("10.00"))
+
+    def get_both(self, url, params=None):
+        responses = []
+        for path in (self.path, None):
+            cache.clear()
+            with override_settings(CATALOG_SNAPSHOT_PATH=path):
+                response = self.client.get(url, params, HTTP_ACCEPT="application/json")
+            responses.append(
+                (response.status_code, response.content, response.get("Last-Modified"))
+            )
+        self.assertEqual(responses[0], responses[1])
+
+    def test_snapshot_matches_database(self):
+        call_command("build_catalog_snapshot", stdout=StringIO())
+        url = f"/api/products/{self.product.pk}/"
+        self.get_both(url)
+        self.get_both(url, {"expand": "supplier,category,attributes"})
+        self.get_both(url, {"fields": "name,price", "expand": "attributes"})
+        self.get_both(url, {"fields": "nope"})
+        self.get_both(f"/api/categories/{self.product.category_id}/")
+        self.get_both(f"/api/suppliers/{self.product.supplier_id}/")
+        self.get_both("/api/products/bulk/", {"ids": f"{self.product.pk},999999"})
+
+    def test_reads_served_from_snapshot(self):
+        call_command("build_catalog_snapshot", stdout=StringIO())
+        cache.clear()
+        # Только чтение версии каталога.
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f"/api/products/{self.product.pk}/", {"expand": "supplier"}
+            )
+        self.assertEqual(response.data["supplier"]["name"], "Связной")
+
+    def test_stale_snapshot_is_ignored(self):
+        call_command("build_catalog_snapshot", stdout=StringIO())
+        self.product.name = "Смартфон 2"
+        self.product.save()
+        response = self.client.get(f"/api/products/{self.product.pk}/")
+        self.assertEqual(response.data["name"], "Смартфон 2")
+
+        call_command("build_catalog_snapshot", stdout=StringIO())
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/{self.product.pk}/")
+        self.assertEqual(response.data["name"], "Смартфон 2")
+
+    def test_load_data_publishes_snapshot(self):
+        data_file = Path(__file__).resolve().parent.parent / "data.yml"
+        call_command("load_data", str(data_file), "--bulk", stdout=StringIO())
+        snapshot = CatalogSnapshot(self.path)
+        self.assertEqual(len(snapshot), Product.objects.count())
+        self.assertEqual(snapshot.get("products", self.product.pk)["name"], "Смартфон")
+
+    def test_sync_stock_publishes_snapshot(self):
+        Product.objects.filter(pk=self.product.pk).update(sku="SKU-1")
+        call_command("build_catalog_snapshot", stdout=StringIO())
+        with TemporaryDirectory() as directory:
+            path = Path(directory, "stock.csv")
+            path.write_text("sku,price,quantity\nSKU-1,150.00,7\n", encoding="utf-8")
+            call_command("sync_stock", str(path), stdout=StringIO())
+        snapshot = CatalogSnapshot(self.path)
+        self.assertEqual(snapshot.get("products", self.product.pk)["price"], "150.00")
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/{self.product.pk}/")
+        self.assertEqual(response.data["stock_quantity"], 7)
+
+
+class CartQueryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="cart_user", password="password")
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def add_items(self, count):
+        for index in range(count):
+            product = Product.objects.create(
+                name=f"Товар {index}", price=Decimal("10.25") + index
+            )
+            CartItem.objects.create(cart=self.cart, product=product, quantity=2)
+
+    def test_cart_queries_do_not_grow_with_items(self):
+        self.add_items(1)
+        with self.assertNumQueries(2):
+            self.client.get(reverse("cart-detail"))
+
+        self.add_items(20)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("cart-detail"))
+        self.assertEqual(len(response.data["items"]), 21)
+
+    def test_cart_totals_computed_in_database(self):
+        self.add_items(3)
+        response = self.client.get(reverse("cart-detail"))
+        self.assertEqual(
+            [item["item_total"] for item in response.data["items"]],
+            [Decimal("20.50"), Decimal("22.50"), Decimal("24.50")],
+        )
+        self.assertEqual(response.data["total_amount"], Decimal("67.50"))
+        self.assertEqual(self.cart.get_total(), Decimal("67.50"))
+        self.assertEqual(response.data["items"][0]["product"]["price"], "10.25")
+
+    def test_empty_cart_total(self):
+        response = self.client.get(reverse("cart-detail"))
+        self.assertEqual(response.data["items"], [])
+        self.assertEqual(self.cart.get_total(), Decimal("0.00"))
+
+
+class CartSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="summary_user", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.phone = Product.objects.create(name="Смартфон", price=Decimal("100.00"))
+        self.case = Product.objects.create(name="Чехол", price=Decimal("9.90"))
+
+    def get_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("cart-summary"))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_summary_follows_cart_mutations(self):
+        self.assertEqual(self.get_summary(), {"item_count": 0, "subtotal": "0.00"})
+
+        url = reverse("cart-item-list")
+        self.client.post(url, {"product_id": self.phone.pk, "quantity": 1})
+        self.client.post(url, {"product_id": self.case.pk, "quantity": 2})
+        self.client.post(url, {"product_id": self.phone.pk, "quantity": 1})
+        self.assertEqual(self.get_summary(), {"item_count": 4, "subtotal": "219.80"})
+
+        item = CartItem.objects.get(product=self.case)
+        self.client.patch(
+            reverse("cart-item-detail", kwargs={"pk": item.pk}), {"quantity": 1}
+        )
+        self.assertEqual(self.get_summary(), {"item_count": 3, "subtotal": "209.90"})
+
+        self.client.delete(reverse("cart-item-detail", kwargs={"pk": item.pk}))
+        self.assertEqual(self.get_summary(), {"item_count": 2, "subtotal": "200.00"})
+
+    def test_summary_follows_price_changes(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.phone, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.case, quantity=1)
+        refresh_carts([cart.pk])
+
+        self.phone.price = Decimal("120.00")
+        self.phone.save()
+        self.assertEqual(self.get_summary(), {"item_count": 3, "subtotal": "249.90"})
+
+        with TemporaryDirectory() as directory:
+            feed = Path(directory, "prices.csv")
+            feed.write_text("sku,price,quantity\nCASE-1,19.90,5\n", encoding="utf-8")
+            self.case.sku = "CASE-1"
+            self.case.save()
+            call_command("sync_stock", str(feed), stdout=StringIO())
+        self.assertEqual(self.get_summary(), {"item_count": 3, "subtotal": "259.90"})
+
+        self.case.delete()
+        self.assertEqual(self.get_summary(), {"item_count": 2, "subtotal": "240.00"})
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tapper", password="password")
+        self.product = Product.objects.create(name="Смартфон", price=Decimal("10.00"))
+
+    def add(self, quantity):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        try:
+            return client.post(
+                reverse("cart-item-list"),
+                {"product_id": self.product.pk, "quantity": quantity},
+            ).status_code
+        finally:
+            connection.close()
+
+    def test_concurrent_adds_sum_up(self):
+        threads, adds = 8, 40
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            statuses = list(executor.map(self.add, [1, 2] * (adds // 2)))
+        self.assertEqual(statuses, [201] * adds)
+
+        item = CartItem.objects.get(cart__user=self.user, product=self.product)
+        self.assertEqual(item.quantity, 3 * adds // 2)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.item_count, item.quantity)
+        self.assertEqual(cart.subtotal, Decimal("10.00") * item.quantity)
+
+    def test_snapshot_build_does_not_block_cart_writes(self):
+        statuses = []
+
+        def add_during_build(execute, sql, params, many, context):
+            if not statuses and sql.startswith("SELECT"):
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    statuses.append(executor.submit(self.add, 1).result())
+            return execute(sql, params, many, context)
+
+        with TemporaryDirectory() as directory:
+            with connection.execute_wrapper(add_during_build):
+                build_snapshot(str(Path(directory, "catalog.snapshot")))
+        self.assertEqual(statuses, [201])
+
+
+class CartBatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bundle", password="password")
+        self.client.force_authenticate(user=self.user)
+        self.products = [
+            Product.objects.create(name=f"Товар {index}", price=Decimal("10.00"))
+            for index in range(30)
+        ]
+        self.url = reverse("cart-item-batch")
+
+    def test_batch_applies_operations(self):
+        first, second, third = self.products[:3]
+        self.client.post(
+            reverse("cart-item-list"), {"product_id": first.pk, "quantity": 2}
+        )
+        self.client.post(
+            reverse("cart-item-list"), {"product_id": third.pk, "quantity": 1}
+        )
+
+        response = self.client.post(
+            self.url,
+            {
+                "operations": [
+                    {"product_id": first.pk, "delta": 3},
+                    {"product_id": second.pk, "quantity": 4},
+                    {"product_id": second.pk, "delta": -1},
+                    {"product_id": third.pk, "delta": -1},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (item["product"]["id"], item["quantity"])
+                for item in response.data["items"]
+            ],
+            [(first.pk, 5), (second.pk, 3)],
+        )
+        self.assertEqual(response.data["total_amount"], Decimal("80.00"))
+        self.assertEqual(
+            self.client.get(reverse("cart-summary")).data,
+            {"item_count": 8, "subtotal": "80.00"},
+        )
+
+    def test_batch_queries_do_not_grow(self):
+        def post(products):
+            return self.client.post(
+                self.url,
+                {
+                    "operations": [
+                        {"product_id": product.pk, "delta": 1} for product in products
+                    ]
+                },
+                format="json",
+            )
+
+        Cart.objects.create(user=self.user)
+        post(self.products[:1])
+        with CaptureQueriesContext(connection) as queries:
+            post(self.products[1:2])
+        with self.assertNumQueries(len(queries)):
+            response = post(self.products[2:30])
+        self.assertEqual(len(response.data["items"]), 30)
+
+    def test_batch_validation_is_all_or_nothing(self):
+        response = self.client.post(
+            self.url,
+            {
+                "operations": [
+                    {"product_id": self.products[0].pk, "quantity": 1},
+                    {"product_id": 999999, "quantity": 1},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("999999", str(response.data["operations"]))
+        self.assertFalse(CartItem.objects.exists())
+
+        for operation in (
+            {"product_id": self.products[0].pk},
+            {"product_id": self.products[0].pk, "quantity": 1, "delta": 1},
+            {"product_id": self.products[0].pk, "quantity": -1},
+        ):
+            response = self.client.post(
+                self.url, {"operations": [operation]}, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {"operations": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_rejects_oversized_quantities(self):
+        product = self.products[0]
+        for operations in (
+            [{"product_id": product.pk, "quantity": 10**20}],
+            [{"product_id": product.pk, "delta": 2**62}] * 2,
+            [{"product_id": product.pk, "delta": 2**31 - 1}] * 2,
+            # Количество допустимо, но сумма не помещается в Cart.subtotal.
+            [{"product_id": product.pk, "quantity": 2**31 - 1}],
+        ):
+            response = self.client.post(
+                self.url, {"operations": operations}, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(
+            self.client.get(reverse("cart-summary")).data,
+            {"item_count": 0, "subtotal": "0.00"},
+        )
+
+    def test_single_item_rejects_oversized_quantities(self):
+        url = reverse("cart-item-list")
+        product = self.products[0]
+        response = self.client.post(url, {"product_id": product.pk, "quantity": 1})
+        self.assertEqual(response.status_code, 201)
+        item_url = reverse("cart-item-detail", kwargs={"pk": response.data["id"]})
+        for quantity in (2**31 - 1, 2**31 - 2):
+            response = self.client.post(
+                url, {"product_id": product.pk, "quantity": quantity}
+            )
+            self.assertEqual(response.status_code, 400)
+        response = self.client.patch(item_url, {"quantity": 2**31 - 1})
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+        response = self.client.get(reverse("cart-detail"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse("cart-summary")).data,
+            {"item_count": 1, "subtotal": "10.00"},
+        )
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "carts": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "guest-carts",
+        },
+    }
+)
+class GuestCartTests(APITestCase):
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f"Товар {index}", price=Decimal("10.00"))
+            for index in range(3)
+        ]
+        self.url = reverse("cart-guest")
+
+    def add(self, operations, token=None):
+        headers = {"HTTP_X_CART_TOKEN": token} if token else {}
+        return self.client.post(
+            self.url, {"operations": operations}, format="json", **headers
+        )
+
+    def test_guest_cart_lives_in_cache(self):
+        first, second, _ = self.products
+        response = self.add([{"product_id": first.pk, "quantity": 2}])
+        self.assertEqual(response.status_code, 200)
+        token = response.data["token"]
+        self.assertTrue(token)
+
+        response = self.add(
+            [
+                {"product_id": first.pk, "delta": 1},
+                {"product_id": second.pk, "quantity": 1},
+            ],
+            token,
+        )
+        self.assertEqual(response.data["token"], token)
+        self.assertEqual(response.data["total_amount"], "40.00")
+
+        response = self.client.get(self.url, HTTP_X_CART_TOKEN=token)
+        self.assertEqual(
+            [
+                (item["product"]["id"], item["quantity"])
+                for item in response.data["items"]
+            ],
+            [(first.pk, 3), (second.pk, 1)],
+        )
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_forged_token_gets_a_new_cart(self):
+        token = self.add([{"product_id": self.products[0].pk, "quantity": 1}]).data[
+            "token"
+        ]
+        response = self.add(
+            [{"product_id": self.products[1].pk, "quantity": 1}], token + "x"
+        )
+        self.assertNotEqual(response.data["token"], token)
+        self.assertEqual(len(response.data["items"]), 1)
+
+        response = self.client.get(self.url, HTTP_X_CART_TOKEN="forged")
+        self.assertEqual(
+            response.data, {"token": None, "items": [], "total_amount": "0.00"}
+        )
+
+    def test_login_merges_guest_cart(self):
+        first, second, third = self.products
+        user = User.objects.create_user(username="guest", password="password")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=first, quantity=1)
+        refresh_carts([cart.pk])
+
+        token = self.add(
+            [
+                {"product_id": first.pk, "quantity": 2},
+                {"product_id": second.pk, "quantity": 1},
+                {"product_id": third.pk, "quantity": 1},
+            ]
+        ).data["token"]
+        third.delete()
+
+        response = self.client.post(
+            reverse("login"),
+            {"username": "guest", "password": "password", "cart_token": token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(cart.items.values_list("product_id", "quantity")),
+            {first.pk: 3, second.pk: 1},
+        )
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (4, Decimal("40.00")))
+
+        # Корзина перенесена и удалена из кэша: повторный вход не удваивает.
+        self.client.post(
+            reverse("login"),
+            {"username": "guest", "password": "password", "cart_token": token},
+        )
+        self.assertEqual(cart.items.get(product=first).quantity, 3)
+
+    def test_register_merges_guest_cart(self):
+        token = self.add([{"product_id": self.products[0].pk, "quantity": 2}]).data[
+            "token"
+        ]
+        response = self.client.post(
+            reverse("register"),
+            {
+                "username": "newbie",
+                "password": "password123",
+                "email": "newbie@example.com",
+            },
+            HTTP_X_CART_TOKEN=token,
+        )
+        self.assertEqual(response.status_code, 201)
+        cart = Cart.objects.get(user__username="newbie")
+        self.assertEqual(cart.item_count, 2)
+
+    def test_guest_cart_size_is_limited(self):
+        with self.settings(GUEST_CART_MAX_ITEMS=2):
+            response = self.add(
+                [{"product_id": product.pk, "quantity": 1} for product in self.products]
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_guest_cart_quantities_are_bounded(self):
+        product = self.products[0]
+        for operations in (
+            [{"product_id": product.pk, "quantity": 10**20}],
+            [{"product_id": product.pk, "delta": 2**31 - 1}] * 2,
+            [{"product_id": product.pk, "quantity": 2**31 - 1}],
+        ):
+            self.assertEqual(self.add(operations).status_code, 400)
+
+    def test_broken_guest_cart_does_not_block_login(self):
+        first, second, _ = self.products
+        User.objects.create_user(username="guest", password="password")
+        credentials = {"username": "guest", "password": "password"}
+        for items, expected in (
+            ({first.pk: 10**20}, {}),
+            ({first.pk: "2", second.pk: 2}, {second.pk: 2}),
+        ):
+            token = issue_token()
+            get_cache().set(cart_key(token), items)
+            for _ in range(2):
+                response = self.client.post(
+                    reverse("login"), {**credentials, "cart_token": token}
+                )
+                self.assertEqual(response.status_code, 200)
+            self.assertIsNone(get_cache().get(cart_key(token)))
+            self.assertEqual(
+                dict(CartItem.objects.values_list("product_id", "quantity")),
+                expected,
+            )